@@ -0,0 +1,55 @@
+"""Fast churn training vs. the standard pipeline: time, accuracy and memory.
+
+Each mode and scale runs in a fresh process so peak memory is its own.
+Run from the repository root:
+
+    python -m benchmarks.churn_fast            # 1x, 10x and 100x the churn data
+    python -m benchmarks.churn_fast 1 200      # custom scales
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.shap_budget import FEATURES, churn_data
+from shared.churn import CHURN_PARAMS, FAST_CHURN_PARAMS, train_churn_model
+
+DEFAULT_SCALES = [1, 10, 100]
+MODES = {'standard': CHURN_PARAMS, 'fast': FAST_CHURN_PARAMS}
+
+
+def measure(mode, scale):
+    df = churn_data(scale)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    model = train_churn_model(df, FEATURES, MODES[mode])
+    return {
+        'seconds': time.perf_counter() - start,
+        'train_seconds': model['train_seconds'],
+        'accuracy': model['accuracy'],
+        'trees': model['n_trees'],
+        'time_budget_hit': model['time_budget_hit'],
+        # ru_maxrss is in KiB on Linux
+        'peak_mb': (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024,
+    }
+
+
+def main(*scales):
+    for scale in scales or DEFAULT_SCALES:
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.churn_fast', '--measure', mode, str(scale)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{scale:>4}x {mode:>8}: {result['seconds']:7.2f}s total, {result['train_seconds']:7.2f}s training "
+                  f"({result['trees']} trees{', budget hit' if result['time_budget_hit'] else ''}), "
+                  f"accuracy {result['accuracy']:.2%}, peak +{result['peak_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--measure']:
+        print(json.dumps(measure(sys.argv[2], int(sys.argv[3]))))
+    else:
+        main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,39 @@
+"""Memory of the bundled datasets before and after schema compaction.
+
+Also checks that compaction does not change results: RFM of the bundled
+transactions with whole-number quantities and prices (as an upload may have)
+must match RFM of the uncompacted frame.
+Run from the repository root:
+
+    python -m benchmarks.dataset_memory
+"""
+import pandas as pd
+
+from shared.rfm import build_rfm, prepare_transactions
+from shared.schema import DATASETS, compact_frame, load_dataset
+
+TRANSACTIONS = 'data/simulated_transactions.csv'
+RFM_FIELDS = ('InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
+# Quantity and price of every line: small enough for int8, their product is not
+QUANTITY, UNIT_PRICE = 100, 120
+
+
+def check_integer_prices():
+    raw = pd.read_csv(TRANSACTIONS).assign(Quantity=QUANTITY, UnitPrice=UNIT_PRICE)
+    expected = build_rfm(prepare_transactions(raw.copy()), *RFM_FIELDS)
+    actual = build_rfm(prepare_transactions(compact_frame(raw)), *RFM_FIELDS)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_categorical=False)
+    assert (actual['Monetary'] > 0).all(), "compacted revenue overflowed"
+    print(f"RFM of integer-priced transactions matches the uncompacted frame ({len(actual):,} customers)")
+
+
+def main():
+    print(f"{'dataset':<36} {'before MB':>10} {'after MB':>10} {'saved':>7}")
+    for path in DATASETS:
+        report = load_dataset(path).attrs['memory_report']
+        print(f"{path:<36} {report['before_mb']:>10.3f} {report['after_mb']:>10.3f} {report['saved_pct']:>6.1f}%")
+    check_integer_prices()
+
+
+if __name__ == '__main__':
+    main()
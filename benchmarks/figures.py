@@ -0,0 +1,66 @@
+"""SHAP summary plot with and without the point budget, and from the figure cache.
+
+The bundled churn model's SHAP values are replicated to each size, then
+drawn in full as the page used to and through ``shap_summary_png`` (at most
+``BEESWARM_MAX_POINTS`` points), and fetched again from the cache.
+Run from the repository root:
+
+    python -m benchmarks.figures                     # 2k, 20k and 200k rows
+    python -m benchmarks.figures 1000000             # custom sizes
+"""
+import io
+import sys
+import time
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from benchmarks.shap_budget import FEATURES
+from shared.churn import prepare_churn_data, train_churn_model
+from shared.figures import BEESWARM_MAX_POINTS, shap_summary_png
+from shared.schema import load_dataset
+
+DEFAULT_SIZES = [2_000, 20_000, 200_000]
+# Rows drawn in full are only timed up to this size; above it takes minutes
+MAX_FULL_ROWS = 200_000
+
+
+def full_plot(shap_values, X, feature_names):
+    import matplotlib.pyplot as plt
+    import shap
+
+    plt.figure(figsize=(10, 6))
+    shap.summary_plot(shap_values, pd.DataFrame(X, columns=feature_names), show=False)
+    plt.gcf().savefig(io.BytesIO(), format='png', bbox_inches='tight', dpi=200)
+    plt.close('all')
+
+
+def main(*sizes):
+    matplotlib.use('Agg')
+    model = train_churn_model(prepare_churn_data(load_dataset('data/churn.csv')), FEATURES)
+    for n in sizes or DEFAULT_SIZES:
+        rows = np.resize(np.arange(len(model['shap_values'])), n)
+        shap_values, X = model['shap_values'][rows], model['X_encoded'][rows]
+
+        full_s = None
+        if n <= MAX_FULL_ROWS:
+            start = time.perf_counter()
+            full_plot(shap_values, X, model['feature_names'])
+            full_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        shap_summary_png(f"benchmark-{n}", shap_values, X, model['feature_names'])
+        budget_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        shap_summary_png(f"benchmark-{n}", shap_values, X, model['feature_names'])
+        cached_s = time.perf_counter() - start
+
+        full = f"{full_s:6.2f}s" if full_s is not None else "   n/a "
+        print(f"{n:>10,} rows  every point {full}  {BEESWARM_MAX_POINTS:,} points {budget_s:6.2f}s  "
+              f"cached {cached_s * 1e3:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,104 @@
+"""Import-time profile of every page, and a check that the landing page stays light.
+
+Each page runs once headless (``AppTest``) in a fresh interpreter under
+``python -X importtime``. The report gives the first run's time, the modules
+the run imported and the packages that took longest to import. The run fails
+when the landing page imports any of the ML stack, or the recommender page
+imports Surprise (only its training job needs it).
+Run from the repository root:
+
+    python -m benchmarks.imports                                # every page
+    python -m benchmarks.imports pages/Retail_Customer_Insights.py
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+LANDING_PAGE = 'What_We_Can_Do.py'
+PAGES = [
+    LANDING_PAGE,
+    'pages/Retail_Customer_Insights.py',
+    'pages/Understanding_Customer_Churn.py',
+    'pages/User_Based_Recommendations.py',
+]
+# Packages the landing page must not import
+ML_STACK = ['shap', 'xgboost', 'sklearn', 'surprise', 'scipy', 'matplotlib', 'seaborn', 'numba']
+# Packages each page must not import itself
+EXCLUDED_PACKAGES = {
+    LANDING_PAGE: ML_STACK,
+    'pages/User_Based_Recommendations.py': ['surprise'],
+}
+TOP_PACKAGES = 8
+# Written to stderr before the page runs; -X importtime lines after it are the page's
+MARKER = '--- page run ---'
+
+
+def run_page(page):
+    """Run ``page`` once in this process; what it imported and how long it took."""
+    from streamlit.testing.v1 import AppTest
+
+    # Job workers the page starts would inherit -X importtime and mix their imports in
+    sys._xoptions.pop('importtime', None)
+    before = set(sys.modules)
+    print(MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    at = AppTest.from_file(os.path.abspath(page), default_timeout=300).run()
+    seconds = time.perf_counter() - start
+    print(MARKER, file=sys.stderr, flush=True)
+    return {
+        'page': page,
+        'seconds': seconds,
+        'modules': sorted(set(sys.modules) - before),
+        'errors': [str(e.value) for e in at.exception],
+    }
+
+
+def import_times(stderr):
+    """Cumulative import seconds per top-level package, from -X importtime output."""
+    section = stderr.split(MARKER)[1] if MARKER in stderr else ''
+    packages = Counter()
+    for line in section.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented under the one that triggered them
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            packages[name.strip().split('.')[0]] += int(cumulative) / 1e6
+    return packages
+
+
+def profile(page):
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'benchmarks.imports', '--page', page],
+        capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"{page} failed: {out.stderr.strip().splitlines()[-1:]}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['import_times'] = import_times(out.stderr)
+    return result
+
+
+def main(*pages):
+    for page in pages or PAGES:
+        result = profile(page)
+        packages = result['import_times']
+        ml = sorted({name.split('.')[0] for name in result['modules']} & set(ML_STACK))
+        print(f"{page}: first run {result['seconds']:.2f}s, {len(result['modules'])} modules imported "
+              f"in {sum(packages.values()):.2f}s; ML stack: {', '.join(ml) or 'none'}")
+        for name, seconds in packages.most_common(TOP_PACKAGES):
+            print(f"    {name:<24} {seconds:6.3f}s")
+        if result['errors']:
+            print(f"    errors: {result['errors']}")
+        imported = sorted({name.split('.')[0] for name in result['modules']} & set(EXCLUDED_PACKAGES.get(page, [])))
+        assert not imported, f"{page} imports {', '.join(imported)}"
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--page']:
+        print(json.dumps(run_page(sys.argv[2])))
+    else:
+        main(*sys.argv[1:])
@@ -0,0 +1,111 @@
+"""Concurrent sessions training churn models: inline threads vs. the job pool.
+
+Each simulated session asks for a model on its own feature set at the same
+moment. Inline, every session trains in its own thread, as the page used to;
+pooled, the requests go through ``shared.jobs`` and queue for the workers.
+Then checks that a failed job stays failed until it is retried, and that
+the pool recovers from a worker process that dies.
+Run from the repository root:
+
+    python -m benchmarks.jobs            # 8 sessions
+    python -m benchmarks.jobs 4 16       # custom session counts
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.shap_budget import FEATURES, churn_data
+from shared.churn import train_churn_model
+from shared.jobs import JOB_WORKERS, WORKER_DIED_MESSAGE, QueueFullError, job_result, job_status, submit
+
+DEFAULT_SESSIONS = [8]
+
+
+def feature_sets(n):
+    """``n`` different feature sets: all features but one, cycling."""
+    return [[col for col in FEATURES if col != FEATURES[i % len(FEATURES)]] for i in range(n)]
+
+
+def run_inline(df, sets):
+    latencies = [0.0] * len(sets)
+
+    def session(i):
+        start = time.perf_counter()
+        train_churn_model(df, sets[i])
+        latencies[i] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(len(sets))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def run_pooled(df, sets, tag):
+    start = time.perf_counter()
+    jobs = [submit(f"{tag}-{i}", train_churn_model, df[columns + ['Churn']], columns)
+            for i, columns in enumerate(sets)]
+    latencies = [None] * len(jobs)
+    while any(latency is None for latency in latencies):
+        for i, job_id in enumerate(jobs):
+            if latencies[i] is None and job_status(job_id)['state'] in ('done', 'failed'):
+                job_result(job_id)
+                latencies[i] = time.perf_counter() - start
+        time.sleep(0.05)
+    return latencies
+
+
+def wait(job_id):
+    while job_status(job_id)['state'] in ('queued', 'running'):
+        time.sleep(0.05)
+    return job_status(job_id)
+
+
+def check_failures():
+    # Builtins as the jobs: functions of this script cannot be pickled by the
+    # workers, which start with an empty __main__
+    assert wait(submit('fail', int, 'not a number'))['state'] == 'failed'
+    submit('fail', int, 'not a number')
+    assert job_status('fail')['state'] == 'failed', "a failed job was started again without retry"
+    # A retry runs whatever it is given, here a call that succeeds
+    submit('fail', int, '3', retry=True)
+    assert wait('fail')['state'] == 'done' and job_result('fail') == 3, "retry did not start the job again"
+    print("failed job: kept until retried")
+
+    assert wait(submit('die', os._exit, 1))['message'] == WORKER_DIED_MESSAGE
+    assert wait(submit('after-die', sum, [1, 2]))['state'] == 'done' and job_result('after-die') == 3
+    print("dead worker: its job failed, the next one ran in a fresh pool")
+
+
+def main(*sessions):
+    df = churn_data(1)
+    # Start the workers before timing, as a running server would have them
+    run_pooled(df, feature_sets(1), 'warmup')
+    for n in sessions or DEFAULT_SESSIONS:
+        sets = feature_sets(n)
+        inline = run_inline(df, sets)
+        pooled = run_pooled(df, sets, f"pooled-{n}")
+        print(f"{n:>3} sessions  inline: median {np.median(inline):6.2f}s  max {max(inline):6.2f}s")
+        print(f"{'':>12}  pooled ({JOB_WORKERS} workers): median {np.median(pooled):6.2f}s  max {max(pooled):6.2f}s")
+
+    # Identical requests share one run; a session cannot queue more than its share
+    first = submit('dedupe', train_churn_model, df[FEATURES + ['Churn']], FEATURES, owner='a')
+    second = submit('dedupe', train_churn_model, df[FEATURES + ['Churn']], FEATURES, owner='b')
+    print(f"duplicate request reused job: {first == second}")
+    try:
+        for i in range(3):
+            submit(f"owner-{i}", train_churn_model, df[FEATURES + ['Churn']], FEATURES, owner='a')
+        print("per-session limit: not enforced")
+    except QueueFullError as e:
+        print(f"per-session limit: {e}")
+    for job_id in ['dedupe', 'owner-0', 'owner-1']:
+        wait(job_id)
+    check_failures()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
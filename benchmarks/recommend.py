@@ -0,0 +1,80 @@
+"""Batch SVD scoring vs. one ``algo.predict`` per item: equivalence and wall time.
+
+Run from the repository root:
+
+    python -m benchmarks.recommend                 # 5,000 users, 2,000 items
+    python -m benchmarks.recommend 20000 10000     # users, items
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from surprise import Dataset, Reader, SVD
+
+from shared.recommend import svd_factors, recommend, recommend_all, TOP_N
+
+# Users checked against the per-item path (it is too slow to run for all of them)
+CHECK_USERS = 50
+
+
+def synthetic_ratings(n_users, n_items, ratings_per_user=20, seed=42):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'User ID': np.repeat(np.arange(n_users), ratings_per_user),
+        'Product ID': rng.integers(0, n_items, n_users * ratings_per_user),
+        'Rating': rng.uniform(1, 5, n_users * ratings_per_user),
+    })
+    return df.drop_duplicates(['User ID', 'Product ID'])
+
+
+def predict_top_n(algo, df, user, n=TOP_N):
+    """The page's original path: predict every unseen item, then sort."""
+    all_items = df['Product ID'].unique()
+    user_items = set(df.loc[df['User ID'] == user, 'Product ID'])
+    predictions = [algo.predict(uid=user, iid=item) for item in all_items if item not in user_items]
+    predictions = [pred for pred in predictions if not pred.details['was_impossible']]
+    return [(pred.iid, pred.est) for pred in sorted(predictions, key=lambda x: x.est, reverse=True)[:n]]
+
+
+def same_recommendations(expected, actual):
+    # Estimates can differ in the last bit (BLAS vs. np.dot summation order)
+    return [iid for iid, _ in expected] == [iid for iid, _ in actual] and np.allclose(
+        [est for _, est in expected], [est for _, est in actual], rtol=0, atol=1e-12)
+
+
+def main(n_users=5_000, n_items=2_000):
+    df = synthetic_ratings(n_users, n_items)
+    # A narrow scale clips many estimates, so tie order is exercised too
+    reader = Reader(rating_scale=(1, 3))
+    train_set = Dataset.load_from_df(df[['User ID', 'Product ID', 'Rating']], reader).build_full_trainset()
+    algo = SVD(random_state=0)
+    algo.fit(train_set)
+    model = svd_factors(algo)
+
+    users = df['User ID'].unique()[:CHECK_USERS]
+    start = time.perf_counter()
+    expected = {user: predict_top_n(algo, df, user) for user in users}
+    predict_s = (time.perf_counter() - start) / len(users)
+
+    start = time.perf_counter()
+    single = {user: recommend(model, user) for user in users}
+    single_s = (time.perf_counter() - start) / len(users)
+
+    start = time.perf_counter()
+    everyone = recommend_all(model)
+    all_s = time.perf_counter() - start
+
+    for user in users:
+        assert same_recommendations(expected[user], single[user]), f"recommend differs for user {user}"
+        assert same_recommendations(expected[user], everyone[user]), f"recommend_all differs for user {user}"
+
+    print(f"{train_set.n_users:,} users, {train_set.n_items:,} items, {train_set.n_ratings:,} ratings")
+    print(f"predict per item   {predict_s * 1000:8.2f} ms/user")
+    print(f"recommend          {single_s * 1000:8.2f} ms/user")
+    print(f"recommend_all      {all_s:8.2f} s for every user ({all_s / train_set.n_users * 1000:.3f} ms/user)")
+    print(f"top-{TOP_N} lists match the per-item path for {len(users)} users")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
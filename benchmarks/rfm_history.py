@@ -0,0 +1,62 @@
+"""Equivalence check and timing of the one-pass RFM history.
+
+``build_rfm_history`` at month-end snapshots is compared with ``build_rfm`` on
+the transactions up to each snapshot, once on the bundled transactions and
+once with a month removed, so one snapshot has no transactions since the
+previous one. Then both are timed on the bundled data.
+Run from the repository root:
+
+    python -m benchmarks.rfm_history
+"""
+import time
+
+import pandas as pd
+
+from shared.rfm import build_rfm, build_rfm_history, prepare_transactions
+from shared.schema import load_dataset
+
+TRANSACTIONS = 'data/simulated_transactions.csv'
+RFM_FIELDS = ('InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
+
+
+def month_ends(df):
+    ends = pd.date_range(df['InvoiceDate'].min().normalize(), df['InvoiceDate'].max(), freq='ME')
+    return ends + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+
+
+def per_snapshot(df, snapshots):
+    return {snapshot: build_rfm(df[df['InvoiceDate'] <= snapshot], *RFM_FIELDS)
+            for snapshot in snapshots if (df['InvoiceDate'] <= snapshot).any()}
+
+
+def check_equivalence(df, snapshots, label):
+    history = build_rfm_history(df, snapshots, *RFM_FIELDS)
+    expected = per_snapshot(df, snapshots)
+    assert list(history.index.get_level_values('Snapshot').unique()) == list(expected), f"{label}: snapshots differ"
+    for snapshot, rfm in expected.items():
+        pd.testing.assert_frame_equal(history.loc[snapshot], rfm, check_dtype=False, check_names=False)
+    print(f"{label}: history matches build_rfm at {len(expected)} snapshots")
+
+
+def main():
+    df = prepare_transactions(load_dataset(TRANSACTIONS))
+    snapshots = month_ends(df)
+    check_equivalence(df, snapshots, "bundled transactions")
+
+    # Drop a month in the middle: its snapshot only carries the earlier ones forward
+    month = df['InvoiceDate'].dt.to_period('M')
+    months = month.unique()
+    gap = df[month != months[len(months) // 2]]
+    check_equivalence(gap, month_ends(gap), f"without {months[len(months) // 2]}")
+
+    start = time.perf_counter()
+    build_rfm_history(df, snapshots, *RFM_FIELDS)
+    history_s = time.perf_counter() - start
+    start = time.perf_counter()
+    per_snapshot(df, snapshots)
+    loop_s = time.perf_counter() - start
+    print(f"{len(snapshots)} snapshots: one pass {history_s:.3f}s, build_rfm per snapshot {loop_s:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Sharded RFM scoring vs. exact build_rfm: wall time and measured error.
+
+Run from the repository root:
+
+    python -m benchmarks.rfm_parallel                   # 1M customers, 10M lines
+    python -m benchmarks.rfm_parallel 200000 2000000    # customers, lines
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from shared.rfm import build_rfm, MONETARY_DECIMALS
+from shared.rfm_parallel import build_rfm_parallel, score_agreement, KLLSketch, QUINTILES
+
+FIELDS = ('InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
+
+
+def synthetic_transactions(n_customers, n_rows, seed=42):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'CustomerID': rng.integers(0, n_customers, n_rows),
+        'InvoiceNo': rng.integers(0, n_rows // 3, n_rows),
+        'InvoiceDate': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 730 * 86400, n_rows), unit='s'),
+        'Revenue': (rng.pareto(2.0, n_rows) * 20).round(2),
+    })
+
+
+def sketch_rank_error(values, shards):
+    """Largest gap between a merged sketch edge's true quantile and its target.
+
+    The sketch is built the way the driver builds it: one per shard, then merged.
+    Returned as a share of customers.
+    """
+    pieces = np.array_split(values, shards)
+    sketch = KLLSketch(seed=0).update(pieces[0])
+    for seed, piece in enumerate(pieces[1:], start=1):
+        sketch.merge(KLLSketch(seed=seed).update(piece))
+    edges = sketch.quantiles(QUINTILES)[1:-1]
+    values = np.sort(values)
+    # A tied value covers a range of ranks; the error is the distance to that range
+    low = np.searchsorted(values, edges, side='left') / len(values)
+    high = np.searchsorted(values, edges, side='right') / len(values)
+    targets = QUINTILES[1:-1]
+    return float(np.max(np.maximum(0, np.maximum(low - targets, targets - high))))
+
+
+def main(n_customers=1_000_000, n_rows=10_000_000):
+    df = synthetic_transactions(n_customers, n_rows)
+
+    start = time.perf_counter()
+    exact = build_rfm(df, *FIELDS)
+    exact_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sharded = build_rfm_parallel(df, *FIELDS)
+    sharded_s = time.perf_counter() - start
+
+    print(f"{len(exact):,} customers, {n_rows:,} lines")
+    print(f"build_rfm          {exact_s:8.2f}s")
+    print(f"build_rfm_parallel {sharded_s:8.2f}s")
+    for column, share in score_agreement(exact, sharded).items():
+        print(f"{column:<10} agreement {share:.4%}")
+    for column in ['Recency', 'Monetary']:
+        values = exact[column].round(MONETARY_DECIMALS).to_numpy(dtype=float)
+        error = sketch_rank_error(values, os.cpu_count())
+        print(f"{column:<10} sketch edge rank error {error:.4%}")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,86 @@
+"""Equivalence check and timing for rules read from the tree arrays.
+
+Trees of several depths are fitted on the one-hot encoded churn data; their
+rules must read exactly like the ones parsed from ``export_text``. Then the
+rule of every row is attached both ways on replicated data.
+Run from the repository root:
+
+    python -m benchmarks.rules               # 1M rows
+    python -m benchmarks.rules 100000        # custom sizes
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier, export_text
+
+from benchmarks.shap_budget import FEATURES, churn_data
+from shared.churn import TARGET
+from shared.rules import explain_tree, leaf_rules, parse_rule_line, rules_for_rows
+
+DEFAULT_SIZES = [1_000_000]
+DEPTHS = [1, 2, 4, 6, 8, 10]
+LABEL = "Churn"
+
+
+def encoded_churn(scale=1):
+    df = churn_data(scale)
+    X = pd.get_dummies(df[FEATURES], dtype=float)
+    # export_text output is split on spaces, so the parsed rules need names without them
+    X.columns = [col.replace(' ', '_') for col in X.columns]
+    return X, df[TARGET]
+
+
+def parsed_rules(clf, feature_names):
+    """Rules of every leaf parsed from the ``export_text`` dump, as explain_tree used to."""
+    translated, path = [], []
+    for line in export_text(clf, feature_names=feature_names).split('\n'):
+        if not line.strip():
+            continue
+        depth, sentence = parse_rule_line(line, LABEL)
+        path = path[:depth] + [sentence]
+        if sentence.startswith("THEN"):
+            translated.append(" → ".join(path))
+    return translated
+
+
+def check_equivalence(X, y):
+    for depth in DEPTHS:
+        for seed in range(5):
+            clf = DecisionTreeClassifier(max_depth=depth, random_state=seed, max_features=0.7).fit(X, y)
+            expected = parsed_rules(clf, list(X.columns))
+            _, translated = explain_tree(None, clf, X, LABEL)
+            assert translated == expected, f"rules differ at depth {depth}, seed {seed}"
+            # Depth-first trees number their nodes in export_text order
+            rules = leaf_rules(clf, X.columns, LABEL)
+            assert list(rules[rules != None]) == expected  # noqa: E711
+    print(f"rules match export_text on {len(DEPTHS) * 5} trees")
+
+
+def main(*sizes):
+    X, y = encoded_churn()
+    check_equivalence(X, y)
+    clf = DecisionTreeClassifier(max_depth=8, random_state=0).fit(X, y)
+    for n in sizes or DEFAULT_SIZES:
+        rows = X.iloc[np.random.default_rng(0).integers(0, len(X), n)]
+
+        start = time.perf_counter()
+        translated = parsed_rules(clf, list(X.columns))
+        leaves = np.flatnonzero(clf.tree_.children_left == -1)
+        parsed = pd.Series(clf.apply(rows)).map(dict(zip(leaves, translated))).to_numpy()
+        parsed_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        attached = rules_for_rows(leaf_rules(clf, X.columns, LABEL), clf, rows)
+        tree_s = time.perf_counter() - start
+        assert (attached == parsed).all()
+
+        pruned = leaf_rules(clf, X.columns, LABEL, min_support=0.01, min_purity=0.8)
+        kept = (rules_for_rows(pruned, clf, rows) != None).mean()  # noqa: E711
+        print(f"{n:>10,} rows  parse + map {parsed_s:6.3f}s  tree arrays {tree_s:6.3f}s  "
+              f"({parsed_s / tree_s:.1f}x); support >= 1% and purity >= 80% keep {kept:.0%} of rows")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
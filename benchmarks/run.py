@@ -0,0 +1,262 @@
+"""Benchmark suite over the analytics hot paths, headless and outside Streamlit.
+
+Every case runs once per dataset size in a fresh process; the data is
+prepared before the clock starts. Memory is the call's own: how far RSS rose
+above its level after setup (the process peak is reset first on Linux). Sizes are row counts
+of data simulated with ``shared.simulate``, or ``bundled`` for the CSVs under
+data/. Results are written as JSON; with ``--baseline`` they are compared to
+an earlier run and the exit status is 1 when any case got slower or bigger
+by more than ``--threshold``, or fails where it passed before.
+Run from the repository root:
+
+    python -m benchmarks.run                                   # bundled, 100k and 1M rows
+    python -m benchmarks.run --sizes bundled 10000000 --cases rfm rules
+    python -m benchmarks.run --baseline benchmarks/results/abc1234.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+from surprise import SVD
+
+from benchmarks.shap_budget import FEATURES
+from shared.churn import train_churn_model
+from shared.recommend import recommend_all, svd_params, train_svd_model
+from shared.rfm import build_rfm, prepare_transactions
+from shared.rules import leaf_rules, rules_for_rows
+from shared.schema import load_dataset
+from shared.simulate import churn_customers, fashion_ratings, transactions
+
+DEFAULT_SIZES = ['bundled', '100000', '1000000']
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+# Allowed slowdown (or memory growth) against the baseline before a case fails
+REGRESSION_THRESHOLD = 0.2
+# Cases faster than this are too noisy to flag on time, or using less memory
+# than this on memory
+MIN_REGRESSION_SECONDS = 0.05
+MIN_REGRESSION_MB = 16
+# Simulated ratings per user and per product: a catalogue that grows slower
+# than the ratings, unlike the bundled file's one rating per product
+RATINGS_PER_USER = 20
+RATINGS_PER_PRODUCT = 100
+
+
+def _simulated(chunks):
+    return pd.concat(list(chunks), ignore_index=True)
+
+
+def setup_rfm(size):
+    df = load_dataset('data/simulated_transactions.csv') if size == 'bundled' else _simulated(transactions(int(size)))
+    return prepare_transactions(df)
+
+
+def run_rfm(df):
+    return build_rfm(df, 'InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
+
+
+def setup_churn(size):
+    if size == 'bundled':
+        df = load_dataset('data/churn.csv').drop(columns=['Unnamed: 0'])
+    else:
+        df = _simulated(churn_customers(int(size)))
+    df['SeniorCitizen'] = df['SeniorCitizen'].astype(str)
+    return df
+
+
+def setup_rules(size):
+    df = setup_churn(size)
+    X = pd.get_dummies(df[FEATURES], dtype=float)
+    return DecisionTreeClassifier(max_depth=8, random_state=0).fit(X, df['Churn']), X
+
+
+def run_rules(state):
+    clf, X = state
+    return rules_for_rows(leaf_rules(clf, X.columns, 'Churn'), clf, X)
+
+
+def setup_recommend(size):
+    if size == 'bundled':
+        df = load_dataset('data/fashion_products.csv')
+    else:
+        n = int(size)
+        df = _simulated(fashion_ratings(n, n_users=max(1, n // RATINGS_PER_USER), n_products=max(1, n // RATINGS_PER_PRODUCT)))
+    ratings = df[['User ID', 'Product ID', 'Rating']]
+    return train_svd_model(ratings, (ratings['Rating'].min(), ratings['Rating'].max()), svd_params(SVD(random_state=0)))
+
+
+def run_recommend(model):
+    return recommend_all(model)
+
+
+def run_churn(df):
+    return train_churn_model(df, FEATURES)
+
+
+# name: (prepare the data for a size, the timed call)
+CASES = {
+    'rfm': (setup_rfm, run_rfm),
+    'rules': (setup_rules, run_rules),
+    'recommend': (setup_recommend, run_recommend),
+    'churn': (setup_churn, run_churn),
+}
+
+
+def peak_rss_mb():
+    """Peak RSS of this process, since the last ``reset_peak_rss`` where that worked."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def rss_mb():
+    """Current RSS of this process, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except OSError:
+        return None
+
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS (Linux 4.0+); False where that is not possible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def measure(case, size):
+    """Time one case on one size in this process.
+
+    ``run_rss_mb`` is how far RSS rose above its level after setup during the
+    call. Without /proc it falls back to how far the process peak rose, which
+    misses calls that stay under the setup's peak.
+    """
+    setup, run = CASES[case]
+    state = setup(size)
+    gc.collect()
+    setup_peak = peak_rss_mb()
+    setup_rss = rss_mb() if reset_peak_rss() else None
+    start = time.perf_counter()
+    run(state)
+    seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    run_rss = peak - (setup_rss if setup_rss is not None else setup_peak)
+    return {
+        'case': case, 'size': size, 'seconds': seconds, 'run_rss_mb': max(0.0, run_rss),
+        'peak_rss_mb': max(peak, setup_peak), 'setup_rss_mb': setup_rss if setup_rss is not None else setup_peak,
+    }
+
+
+def run_case(case, size):
+    """``measure`` in a fresh interpreter, so memory and warm caches do not carry over."""
+    out = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.run', '--measure', case, size],
+        capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        return {'case': case, 'size': size, 'error': out.stderr.strip().splitlines()[-1:]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def current_commit():
+    out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+    return out.stdout.strip() or 'unknown'
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Cases of ``results`` more than ``threshold`` slower or bigger than in ``baseline``.
+
+    Memory is compared on ``run_rss_mb``, the call's own growth, so the
+    setup's peak cannot hide it; baselines recorded before it are compared on
+    time only.
+
+    A case that passed in ``baseline`` but fails now is a regression of metric
+    ``'error'``, with the error as its new value.
+    """
+    before = {(r['case'], r['size']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for result in results['results']:
+        old = before.get((result['case'], result['size']))
+        if old is None:
+            continue
+        if 'error' in result:
+            regressions.append((result['case'], result['size'], 'error', None, result['error']))
+            continue
+        if result['seconds'] > max(old['seconds'], MIN_REGRESSION_SECONDS) * (1 + threshold):
+            regressions.append((result['case'], result['size'], 'seconds', old['seconds'], result['seconds']))
+        if 'run_rss_mb' in old and result['run_rss_mb'] > max(old['run_rss_mb'], MIN_REGRESSION_MB) * (1 + threshold):
+            regressions.append((result['case'], result['size'], 'run_rss_mb', old['run_rss_mb'], result['run_rss_mb']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--output', help=f"JSON file for the results (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    commit = current_commit()
+    results = {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'results': [],
+    }
+    for size in args.sizes:
+        for case in args.cases:
+            result = run_case(case, size)
+            results['results'].append(result)
+            if 'error' in result:
+                print(f"{case:>10} {size:>10}  failed: {result['error']}")
+            else:
+                print(f"{case:>10} {size:>10}  {result['seconds']:9.3f}s  +{result['run_rss_mb']:8.1f} MB  "
+                      f"(process peak {result['peak_rss_mb']:8.1f} MB)")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for case, size, metric, old, new in regressions:
+            if metric == 'error':
+                print(f"REGRESSION {case} {size} failed, passed in the baseline: {new}")
+            else:
+                print(f"REGRESSION {case} {size} {metric}: {old:.3f} -> {new:.3f} ({new / old - 1:+.0%})")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.threshold:.0%} against {baseline['commit']}")
+    return 0
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--measure']:
+        print(json.dumps(measure(sys.argv[2], sys.argv[3])))
+    else:
+        sys.exit(main())
@@ -0,0 +1,61 @@
+"""Equivalence check and timing for the vectorized segmentation engine.
+
+Run from the repository root:
+
+    python -m benchmarks.segments            # 1M, 5M and 10M customers
+    python -m benchmarks.segments 100000     # custom sizes
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from shared.rfm import assign_segments, segment_customer, SCORE_COLUMNS
+
+DEFAULT_SIZES = [1_000_000, 5_000_000, 10_000_000]
+# Row-wise apply is slow; past this size it is timed on a sample and extrapolated.
+APPLY_SAMPLE = 1_000_000
+
+
+def random_scores(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.integers(1, 6, size=(n, 3)), columns=SCORE_COLUMNS)
+
+
+def check_equivalence():
+    # Every score combination, so every rule branch is exercised.
+    grid = np.arange(125)
+    scores = pd.DataFrame({
+        'R_Score': grid // 25 + 1,
+        'F_Score': grid // 5 % 5 + 1,
+        'M_Score': grid % 5 + 1,
+    })
+    expected = scores.apply(segment_customer, axis=1)
+    actual = assign_segments(scores)
+    assert (expected == actual).all(), "vectorized segments differ from segment_customer"
+
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    check_equivalence()
+    print("Equivalence check passed for all 125 score combinations")
+    print(f"{'customers':>12} {'apply (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for n in sizes:
+        scores = random_scores(n)
+        sample = scores.head(min(n, APPLY_SAMPLE))
+        apply_s = time_call(lambda s: s.apply(segment_customer, axis=1), sample) * n / len(sample)
+        vector_s = time_call(assign_segments, scores)
+        estimated = '*' if len(sample) < n else ' '
+        print(f"{n:>12,} {apply_s:>11.2f}{estimated} {vector_s:>15.3f} {apply_s / vector_s:>8.0f}x")
+    if any(n > APPLY_SAMPLE for n in sizes):
+        print(f"* extrapolated from {APPLY_SAMPLE:,} rows")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,67 @@
+"""Budgeted tree SHAP vs. explaining every row: latency and measured error.
+
+The bundled churn data is replicated (with jittered numbers) to larger sizes.
+Run from the repository root:
+
+    python -m benchmarks.shap_budget            # 1x, 10x and 100x the churn data
+    python -m benchmarks.shap_budget 1 10       # custom scales
+"""
+import sys
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from shared.churn import TARGET, TEST_SIZE, SPLIT_SEED, train_churn_model
+from shared.explain import SHAP_SAMPLE_ROWS, compare_shap, tree_shap
+from shared.schema import load_dataset
+
+DEFAULT_SCALES = [1, 10, 100]
+FEATURES = ['gender', 'SeniorCitizen', 'Dependents', 'tenure', 'PhoneService', 'InternetService',
+            'OnlineSecurity', 'TechSupport', 'Contract', 'MonthlyCharges']
+# shap.Explainer over every row is only timed up to this many training rows
+INTERVENTIONAL_MAX_ROWS = 10_000
+
+
+def churn_data(scale, seed=42):
+    df = load_dataset('data/churn.csv')
+    df['SeniorCitizen'] = df['SeniorCitizen'].astype(str)
+    df = df.loc[df.index.repeat(scale)].reset_index(drop=True)
+    if scale > 1:
+        rng = np.random.default_rng(seed)
+        df['tenure'] = (df['tenure'] + rng.integers(-2, 3, len(df))).clip(lower=0)
+        df['MonthlyCharges'] = (df['MonthlyCharges'] * rng.uniform(0.95, 1.05, len(df))).round(2)
+    return df
+
+
+def main(*scales):
+    for scale in scales or DEFAULT_SCALES:
+        df = churn_data(scale)
+        start = time.perf_counter()
+        fast = train_churn_model(df, FEATURES, shap_rows=SHAP_SAMPLE_ROWS)
+        fast_s = time.perf_counter() - start
+
+        # Every training row, with the same algorithm: the exact reference
+        X_train, _ = train_test_split(df[FEATURES], test_size=TEST_SIZE, random_state=SPLIT_SEED, stratify=df[TARGET])
+        X_encoded = fast['pipeline'].named_steps['preprocessor'].transform(X_train)
+        booster = fast['pipeline'].named_steps['classifier'].get_booster()
+        start = time.perf_counter()
+        exact, _ = tree_shap(booster, X_encoded)
+        exact_s = time.perf_counter() - start
+        error = compare_shap(fast['shap_values'], exact, fast['rows'])
+
+        print(f"{scale:>4}x  {fast['n_rows']:>9,} training rows, {len(fast['rows']):,} explained")
+        print(f"      train + budgeted SHAP {fast_s:8.2f}s   tree SHAP on every row {exact_s:8.2f}s")
+        print(f"      importance error {error['max_importance_error']:.2%} of total "
+              f"(reported bound {fast['shap_importance_error']:.2%}), same ranking: {error['same_ranking']}")
+        if fast['n_rows'] <= INTERVENTIONAL_MAX_ROWS:
+            start = time.perf_counter()
+            interventional = train_churn_model(df, FEATURES, shap_rows=None)
+            interventional_s = time.perf_counter() - start
+            vs_interventional = compare_shap(fast['shap_values'], interventional['shap_values'], fast['rows'])
+            print(f"      train + shap.Explainer on every row {interventional_s:8.2f}s; importance differs by "
+                  f"{vs_interventional['max_importance_error']:.2%} of total")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,59 @@
+"""Item neighbour index: build time, recall against exact cosine, lookup latency.
+
+Item vectors are clustered, like SVD factors of a catalogue with product
+families. Run from the repository root:
+
+    python -m benchmarks.similarity                # 200,000 items, 32 factors
+    python -m benchmarks.similarity 500000 64      # items, factors
+"""
+import sys
+import time
+
+import numpy as np
+
+from shared.similarity import exact_neighbours, lsh_neighbours, neighbour_recall, similar_items, index_items
+
+FAMILIES = 2_000
+# Items whose exact neighbours are computed to measure recall
+RECALL_SAMPLE = 1_000
+LOOKUPS = 10_000
+
+
+def clustered_vectors(n_items, n_factors, seed=42):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(FAMILIES, n_factors))
+    return centres[rng.integers(0, FAMILIES, n_items)] + 0.5 * rng.normal(size=(n_items, n_factors))
+
+
+def main(n_items=200_000, n_factors=32):
+    vectors = clustered_vectors(n_items, n_factors)
+
+    start = time.perf_counter()
+    neighbours, similarities = lsh_neighbours(vectors)
+    build_s = time.perf_counter() - start
+
+    sample = np.random.default_rng(0).choice(n_items, min(RECALL_SAMPLE, n_items), replace=False)
+    start = time.perf_counter()
+    exact, _ = exact_neighbours(vectors, rows=sample)
+    exact_s = (time.perf_counter() - start) / len(sample) * n_items
+
+    index = index_items({
+        'neighbours': neighbours.astype(np.int32),
+        'similarities': similarities.astype(np.float32),
+        'raw_iids': np.arange(n_items) + 100_000,
+    })
+    queries = np.random.default_rng(1).integers(0, n_items, LOOKUPS) + 100_000
+    start = time.perf_counter()
+    for raw_iid in queries:
+        similar_items(index, raw_iid, 10)
+    lookup_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+
+    print(f"{n_items:,} items, {n_factors} factors, top-{neighbours.shape[1]} neighbours")
+    print(f"LSH build          {build_s:8.1f}s")
+    print(f"exact all-pairs    {exact_s:8.1f}s (extrapolated from {len(sample):,} items)")
+    print(f"recall vs exact    {neighbour_recall(neighbours[sample], exact):8.2%}")
+    print(f"lookup             {lookup_us:8.1f} µs")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
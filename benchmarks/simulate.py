@@ -0,0 +1,64 @@
+"""Simulated datasets at scale: generation speed, schema check and an RFM load test.
+
+Each dataset is written as CSV and Parquet to a temporary directory, its
+columns and dtypes are checked against the bundled file, and the simulated
+transactions are streamed through ``build_rfm_chunked``.
+Run from the repository root:
+
+    python -m benchmarks.simulate                # 10M transaction lines
+    python -m benchmarks.simulate 50000000       # custom size
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from shared.rfm import build_rfm_chunked, read_transactions_chunked
+from shared.simulate import churn_customers, fashion_ratings, transactions, write_table
+
+DEFAULT_ROWS = 10_000_000
+# Ratings and churn rows per transaction line
+RATINGS_SHARE = 0.1
+CHURN_SHARE = 0.01
+
+
+def check_schema(path, bundled, index_col=None):
+    simulated = pd.read_csv(path, nrows=1000, index_col=index_col)
+    expected = pd.read_csv(bundled, nrows=1000, index_col=index_col)
+    assert list(simulated.columns) == list(expected.columns), f"{path}: columns differ from {bundled}"
+    assert (simulated.dtypes == expected.dtypes).all(), f"{path}: dtypes differ from {bundled}"
+
+
+def write(name, make_chunks, directory, index=False):
+    paths = {}
+    for ext in ['csv', 'parquet']:
+        path = os.path.join(directory, f"{name}.{ext}")
+        start = time.perf_counter()
+        rows = write_table(make_chunks(), path, index=index)
+        seconds = time.perf_counter() - start
+        print(f"{name:>13}.{ext:<7} {rows:>12,} rows  {seconds:7.2f}s  {rows / seconds:>12,.0f} rows/s  "
+              f"{os.path.getsize(path) / 1024 ** 2:8.1f} MB")
+        paths[ext] = path
+    return paths
+
+
+def main(n_rows=DEFAULT_ROWS):
+    with tempfile.TemporaryDirectory() as directory:
+        sales = write('transactions', lambda: transactions(n_rows), directory)
+        check_schema(sales['csv'], 'data/simulated_transactions.csv')
+        ratings = write('ratings', lambda: fashion_ratings(int(n_rows * RATINGS_SHARE)), directory)
+        check_schema(ratings['csv'], 'data/fashion_products.csv')
+        churn = write('churn', lambda: churn_customers(int(n_rows * CHURN_SHARE)), directory, index=True)
+        check_schema(churn['csv'], 'data/churn.csv', index_col=0)
+        print("schemas match the bundled datasets")
+
+        start = time.perf_counter()
+        rfm = build_rfm_chunked(read_transactions_chunked(sales['csv']), 'InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
+        print(f"RFM over {n_rows:,} lines: {len(rfm):,} customers in {time.perf_counter() - start:.1f}s")
+        print(rfm['Segment'].value_counts(normalize=True).round(3).to_string())
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,61 @@
+"""Cost of the tracing layer per span, switched off and on.
+
+Times an empty ``with span(...)`` block and a ``traced`` function call
+against the bare call, then RFM on the bundled transactions with and
+without its spans. Nothing is written to a sink.
+Run from the repository root:
+
+    python -m benchmarks.tracing             # 100k empty spans
+    python -m benchmarks.tracing 1000000     # custom count
+"""
+import sys
+import time
+
+from shared import tracing
+from shared.rfm import build_rfm, prepare_transactions
+from shared.schema import load_dataset
+
+DEFAULT_CALLS = 100_000
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def empty_span():
+    with tracing.span("empty"):
+        pass
+
+
+def nothing():
+    pass
+
+
+def run_rfm(df):
+    start = time.perf_counter()
+    with tracing.span("build_rfm", df):
+        build_rfm(df, 'InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
+    return time.perf_counter() - start
+
+
+def main(calls=DEFAULT_CALLS):
+    tracing.TRACE_SINK = ""
+    df = prepare_transactions(load_dataset('data/simulated_transactions.csv'))
+    bare = per_call(nothing, calls)
+    for trace in [False, True]:
+        tracing.TRACE = trace
+        tracing.start_page("benchmark")
+        # traced() decides at decoration time, like it does at import in the app
+        decorated = tracing.traced()(nothing)
+        span_s = per_call(empty_span, calls) - bare
+        traced_s = per_call(decorated, calls) - bare
+        rfm_s = min(run_rfm(df) for _ in range(5))
+        print(f"tracing {'on ' if trace else 'off'}  span {span_s * 1e6:7.2f} us  traced {traced_s * 1e6:7.2f} us  "
+              f"build_rfm on {len(df):,} lines {rfm_s * 1e3:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
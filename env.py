@@ -1,2 +1,11 @@
+import os
+
 from dotenv import load_dotenv
 load_dotenv()
+
+# Time the stages of every page run and show them in a sidebar panel
+TRACE = os.getenv("HOLITICA_TRACE", "").lower() in ("1", "true", "yes", "on")
+# Optional export of the recorded spans: a .jsonl file gets one span per line,
+# any other path the per-stage totals in the Prometheus text format (for a
+# node_exporter textfile collector)
+TRACE_SINK = os.getenv("HOLITICA_TRACE_SINK", "")
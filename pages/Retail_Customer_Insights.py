@@ -1,19 +1,22 @@
 import streamlit as st
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
 
 from shared.form import dataset_form_in_columns
-from shared.rfm import build_rfm
+from shared.insights import get_insights, get_rfm_history, month_end_snapshots
+from shared.rfm import segment_transitions
 from shared.const import show_side_bar_with_more
+from shared.store import load_shared_dataset
+from shared.demand import top_products_for, recommend_for_customer
+from shared.figures import cached_figure, figure_key
+from shared.tracing import set_dataset, show_trace_panel, span, start_page
+start_page("Retail Customer Insights")
 show_side_bar_with_more()
 st.set_page_config(page_title="Retail Customer Insights")
 left, right = st.columns([3, 1])  # Wider left, narrower right
 
-@st.cache_data
+# Served from the shared store as a read-only view; no per-session copy
 def load_data():
-    return pd.read_csv('data/simulated_transactions.csv')
-
+    return load_shared_dataset('data/simulated_transactions.csv')
 
 default_df = load_data()
 df = dataset_form_in_columns(
@@ -22,19 +25,15 @@ df = dataset_form_in_columns(
     required_columns=['InvoiceNo', 'Quantity', 'UnitPrice', 'CustomerID', 'InvoiceDate', 'Description'],
     help_text="File must include columns: Quantity, UnitPrice, CustomerID, InvoiceDate"
 )
+set_dataset(df)
 
 with left:
 
     if df is not None:
         ### Calculate RFM and merge
-        df['Revenue'] = df['Quantity'] * df['UnitPrice']
-        df['CustomerID'] = df['CustomerID'].astype(int)
-        # Make sure InvoiceDate is in datetime format
-        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-
-        rfm = build_rfm(df, 'InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
-        # Merge RFM table (with CustomerID, Segment) back to the main DataFrame
-        df_merged = df.merge(rfm[['Segment']], on='CustomerID')
+        # Shared by all sessions; the bundled dataset's tables are built with the image
+        dataset = df
+        df, rfm, df_merged, demand_index = get_insights(dataset)
 
         # Segment labels
         vip_label = 'VIP'
@@ -83,69 +82,90 @@ if df is not None:
     revenue_labels = [f"{others_label} {others_revenue}%", f"{vip_label} {vip_revenue}%"]
 
     # Plot
-    fig, axes = plt.subplots(1, 2, figsize=(6, 8))
-    # Colors: [Others, VIP]
-    colors = ['#4682B4', '#FF6347']
+    def draw_shares():
+        # Plotting libraries load only when a figure is not cached yet
+        import matplotlib.pyplot as plt
+
+        fig, axes = plt.subplots(1, 2, figsize=(6, 8))
+        # Colors: [Others, VIP]
+        colors = ['#4682B4', '#FF6347']
 
-    axes[0].pie(customer_counts_pct, labels=customer_labels, colors=colors, startangle=90,
-                wedgeprops={'width': 0.4})
-    axes[0].set_title('Customer Share')
+        axes[0].pie(customer_counts_pct, labels=customer_labels, colors=colors, startangle=90,
+                    wedgeprops={'width': 0.4})
+        axes[0].set_title('Customer Share')
 
-    axes[1].pie(revenue_contribution_pct, labels=revenue_labels, colors=colors, startangle=90,
-                wedgeprops={'width': 0.4})
-    axes[1].set_title('Revenue Share')
+        axes[1].pie(revenue_contribution_pct, labels=revenue_labels, colors=colors, startangle=90,
+                    wedgeprops={'width': 0.4})
+        axes[1].set_title('Revenue Share')
+        return fig
 
 
     st.write("### Let's dive in")
     st.write("#### A Small Group, A Big Impact")
     st.caption("Let's see what fraction of revenue VIP customers hold")
     st.write()
-    # Display in Streamlit
-    st.pyplot(fig)
+    # Display in Streamlit; rendered once for these shares, then served as PNG bytes
+    with span("plot_shares"):
+        shares_key = figure_key("shares", customer_labels, revenue_labels, customer_counts_pct, revenue_contribution_pct)
+        st.image(cached_figure(shares_key, draw_shares), use_container_width=True)
 
     # Sort segments by count order
-    segment_order = rfm['Segment'].value_counts().index
-
-    fig, ax = plt.subplots(figsize=(10, 5))
-    sns.countplot(data=rfm, x='Segment', order=segment_order, palette='muted')
+    segment_counts = rfm['Segment'].value_counts()
+    segment_order = segment_counts.index
+
+    def draw_segments():
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        fig, ax = plt.subplots(figsize=(10, 5))
+        sns.countplot(data=rfm, x='Segment', order=segment_order, palette='muted')
+
+        plt.title('Customer Count by Segment')
+        plt.xlabel('Segment')
+        plt.ylabel('Number of Customers')
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+
+        # Better version using index directly
+        for p, segment in zip(ax.patches, segment_order):
+            height = p.get_height()
+            share = segment_revenue_share.get(segment, 0.0)
+            ax.annotate(f'{share:.1f}%',
+                        (p.get_x() + p.get_width() / 2., height),
+                        ha='center', va='bottom', fontsize=9, color='black')
+        return fig
 
     st.write("### A more detailed view on customer segments")
-
-    plt.title('Customer Count by Segment')
-    plt.xlabel('Segment')
-    plt.ylabel('Number of Customers')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    # Better version using index directly
-    for p, segment in zip(ax.patches, segment_order):
-        height = p.get_height()
-        share = segment_revenue_share.get(segment, 0.0)
-        ax.annotate(f'{share:.1f}%',
-                    (p.get_x() + p.get_width() / 2., height),
-                    ha='center', va='bottom', fontsize=9, color='black')
     st.caption("% values represent each segment’s share of total revenue")
-    # Display in Streamlit
-    st.pyplot(fig)
+    # Display in Streamlit; the counts and shares are all the plot shows, so they key it
+    with span("plot_segments"):
+        segments_key = figure_key("segments", segment_counts.to_dict(), segment_revenue_share.to_dict())
+        st.image(cached_figure(segments_key, draw_segments), use_container_width=True)
 
+    ### How customers move between segments
 
-    ### What products VIPs prefer
+    # Month-end snapshots over the last two years; the history is shared by all sessions
+    snapshots = month_end_snapshots(df['InvoiceDate'])
+    if len(snapshots) > 1:
+        history = get_rfm_history(dataset, snapshots)
+        snapshots = history.index.get_level_values('Snapshot').unique()
 
-    top_vip = (
-        df_merged[df_merged['Segment'] == vip_label]
-        .groupby('Description')['Quantity']
-        .sum()
-        .sort_values(ascending=False)
-        .head(10)
-    )
+        st.write("### How customers move between segments")
+        st.caption("Share of each starting segment that ended up in each segment. New customers appear as 'New'")
+        col1, col2 = st.columns(2)
+        with col1:
+            from_date = st.selectbox("From", snapshots[:-1], format_func=lambda d: d.strftime('%B %Y'))
+        with col2:
+            to_date = st.selectbox("To", snapshots[snapshots > from_date][::-1], format_func=lambda d: d.strftime('%B %Y'))
 
-    top_others = (
-        df_merged[df_merged['Segment'] != vip_label]
-        .groupby('Description')['Quantity']
-        .sum()
-        .sort_values(ascending=False)
-        .head(10)
-    )
+        transitions = segment_transitions(history, from_date, to_date, normalize=True)
+        st.dataframe(transitions.style.format('{:.0%}').background_gradient(cmap='Blues', axis=None))
+
+
+    ### What products VIPs prefer
+
+    top_vip = top_products_for(demand_index, [vip_label])
+    top_others = top_products_for(demand_index, [vip_label], exclude=True)
 
 
     vip_products = set(top_vip.index)
@@ -185,19 +205,10 @@ if df is not None:
     st.write("### Recommend Products for the Customer")
     st.caption("Based on segment preferences we can build a recommendation system")
 
-    segment = st.selectbox("Select a customer segment", df_merged['Segment'].unique())
-
-    group_df = df_merged[(df_merged['Segment'] == segment)]
-    top_products = (
-        group_df.groupby('Description')['Quantity']
-        .sum()
-        .sort_values(ascending=False)
-        .head(10)
-    )
-    customer_id = st.selectbox("Select a customer", df_merged[df_merged['Segment'] == segment]['CustomerID'].unique())
+    segment = st.selectbox("Select a customer segment", demand_index['segments'])
+    customer_id = st.selectbox("Select a customer", demand_index['customers_by_segment'][segment])
 
-    customer_products = df_merged[df_merged['CustomerID'] == customer_id]['Description'].unique()
-    recommended = top_products[~top_products.index.isin(customer_products)]
+    recommended = recommend_for_customer(demand_index, segment, customer_id)
 
     st.caption("Products that are popular in the group but chosen Customer haven't tried")
     st.dataframe(recommended.reset_index().rename(columns={'Description': 'Product', 'Quantity': 'Group Demand'}))
@@ -215,3 +226,5 @@ st.markdown("""
 
 If you’d like a custom analysis on your data register [here](https://request.holitica.it/) or contact victor@holitica.it. Also you can find Holitica on [LinkedIn](https://www.linkedin.com/company/holitica/).
 """)
+
+show_trace_panel()
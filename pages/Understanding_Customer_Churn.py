@@ -1,20 +1,22 @@
-import pandas as pd
 import streamlit as st
-import shap
-import matplotlib.pyplot as plt
-from sklearn.compose import ColumnTransformer
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.pipeline import Pipeline
-from xgboost import XGBClassifier
 
+from shared.churn import (
+    CHURN_PARAMS, FAST_CHURN_PARAMS, cached_churn_model, churn_model_key, prepare_churn_data, record_selection,
+    start_churn_model, warm_churn_models,
+)
+from shared.explain import SHAP_SAMPLE_ROWS
+from shared.figures import shap_summary_png
+from shared.jobs import QueueFullError, job_status, session_owner, show_job_failure, show_job_progress
 from shared.form import dataset_form_in_columns
 from shared.const import show_side_bar_with_more
+from shared.store import load_shared_dataset
+from shared.tracing import set_dataset, show_trace_panel, span, start_page
 
 # -------------------------
 # Column descriptions
 # -------------------------
 st.set_page_config(page_title="Understanding Customer Churn")
+start_page("Understanding Customer Churn")
 
 left, right = st.columns([3, 1])  # Wider left, narrower right
 
@@ -102,20 +104,19 @@ rename_map = {
 show_side_bar_with_more()
 
 # Load and cache data
-@st.cache_data
+# Served from the shared store as a read-only view; no per-session copy
 def load_data():
-    return pd.read_csv('data/churn.csv')
+    return load_shared_dataset('data/churn.csv')
 
 # -------------------------
 # Load and preprocess data
 # -------------------------
-df = load_data()
-# Drop index column if present
-if "Unnamed: 0" in df.columns:
-    df = df.drop(columns=["Unnamed: 0"])
+# The bundled data's models are trained with the image (see precompute.py)
+df = prepare_churn_data(load_data())
+set_dataset(df)
 
-# Treat 'SeniorCitizen' as categorical
-df['SeniorCitizen'] = df['SeniorCitizen'].astype(str)
+# Train the usual feature sets in the background while the page is read
+warm_churn_models(df)
 
 # -------------------------
 # Streamlit UI
@@ -152,9 +153,33 @@ selected_options = st.multiselect(
     default=None
 )
 
+# Fast mode explains a fixed-size sample, so its cost does not grow with the dataset
+explanation_modes = {
+    f"Fast (a sample of up to {SHAP_SAMPLE_ROWS:,} customers)": SHAP_SAMPLE_ROWS,
+    "Exact (every customer, slower)": None,
+}
+explanation_mode = st.radio("Explanation detail", list(explanation_modes), horizontal=True)
+
+# Fast training stops early and within a time budget, for uploads of millions of rows
+training_modes = {
+    "Standard": CHURN_PARAMS,
+    f"Fast (at most {FAST_CHURN_PARAMS['time_budget_s']:.0f}s of training)": FAST_CHURN_PARAMS,
+}
+training_mode = st.radio("Training", list(training_modes), horizontal=True)
+
 # Only run if user selected at least 5 features
 if len(selected_options) > 4 and st.button("Explore Churn Risk Factors"):
     st.toast("🚀 Running churn prediction...")
+    selected_columns = [description_to_column[desc] for desc in selected_options]
+    record_selection(df, selected_columns)
+    st.session_state['churn_request'] = (
+        selected_columns, explanation_modes[explanation_mode], training_modes[training_mode]
+    )
+
+# Training runs in the shared job pool; the page polls it until the model is ready
+churn_request = st.session_state.get('churn_request')
+if churn_request is not None:
+    selected_columns, shap_rows, params = churn_request
 
     # Immediately show the help text
     st.markdown("""
@@ -175,8 +200,6 @@ if len(selected_options) > 4 and st.button("Explore Churn Risk Factors"):
     **Example**: If blue dots (short tenure) appear on the right for "tenure", it means short-tenure customers are more likely to churn.
     """)
 
-    selected_columns = [description_to_column[desc] for desc in selected_options]
-
     # Show insights for selected features (if any are in the map)
     st.markdown("### 🔍 Feature Insights")
 
@@ -184,58 +207,50 @@ if len(selected_options) > 4 and st.button("Explore Churn Risk Factors"):
         if col in insight_map:
             st.markdown(f"- **{column_descriptions[col]}**: {insight_map[col]}")
 
-    with st.spinner("⏳ Training model and explaining predictions..."):
-        import time
-
-        time.sleep(0.5)  # Give spinner time to show before heavy lifting
-        # Feature matrix and target
-        X = df[selected_columns]
-        y = df["Churn"]
-
-        # Identify column types
-        cat_cols = X.select_dtypes(include=["object", "category"]).columns.tolist()
-        num_cols = X.select_dtypes(exclude=["object", "category"]).columns.tolist()
-
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y
+    # Fitted once per dataset and feature set, whichever order the features were picked in
+    churn_model = cached_churn_model(df, selected_columns, params, shap_rows)
+    if churn_model is None:
+        try:
+            job_id = start_churn_model(df, selected_columns, params, shap_rows, owner=session_owner())
+        except QueueFullError as e:
+            st.warning(str(e))
+        else:
+            status = job_status(job_id)
+            if status['state'] == 'done':
+                churn_model = cached_churn_model(df, selected_columns, params, shap_rows)
+            elif status['state'] == 'failed':
+                show_job_failure(job_id, f"Training failed: {status['message']}", lambda: start_churn_model(
+                    df, selected_columns, params, shap_rows, owner=session_owner(), retry=True))
+            else:
+                st.session_state['churn_waiting'] = True
+                show_job_progress(job_id, "⏳ Training model and explaining predictions...")
+
+    if churn_model is not None:
+        if st.session_state.pop('churn_waiting', False):
+            st.toast("✅ Model is ready. Scroll down to view insights!")
+        feature_names = [rename_map.get(name, name) for name in churn_model['feature_names']]
+        shap_values = churn_model['shap_values']
+
+        # Display plot: drawn once per model from a fixed budget of points, then
+        # served as PNG bytes (shap and matplotlib load only to draw it)
+        st.subheader("🔍 What Influences Churn the Most?")
+        with span("shap_plot", shap_values):
+            plot = shap_summary_png(
+                churn_model_key(df, selected_columns, params, shap_rows),
+                shap_values, churn_model['X_encoded'], feature_names,
+            )
+            st.image(plot, use_container_width=True)
+        st.caption(
+            f"Trained in {churn_model['train_seconds']:.1f}s"
+            f"{' (stopped at the time budget)' if churn_model['time_budget_hit'] else ''}; predicts churn "
+            f"correctly for {churn_model['accuracy']:.1%} of {churn_model['n_test']:,} held-out customers."
         )
-
-        # Preprocessor and pipeline
-        preprocessor = ColumnTransformer(
-            transformers=[
-                ("cat", OneHotEncoder(handle_unknown="ignore", drop=None), cat_cols)
-            ],
-            remainder="passthrough"
-        )
-        clf = Pipeline(steps=[
-            ("preprocessor", preprocessor),
-            ("classifier", XGBClassifier(use_label_encoder=False, eval_metric="logloss", random_state=42))
-        ])
-        clf.fit(X_train, y_train)
-
-        # Get encoded feature names
-        ohe = preprocessor.named_transformers_['cat']
-        encoded_cat_cols = ohe.get_feature_names_out(cat_cols)
-        feature_names = list(encoded_cat_cols) + num_cols
-        feature_names = [rename_map.get(name, name) for name in feature_names]
-
-
-        # Create DataFrame with named columns
-        X_encoded = preprocessor.transform(X_train)
-        X_encoded_df = pd.DataFrame(X_encoded, columns=feature_names)
-
-        # SHAP explainer
-        explainer = shap.Explainer(clf.named_steps["classifier"], X_encoded_df)
-        shap_values = explainer(X_encoded_df)
-
-    # Optional toast after spinner
-    st.toast("✅ Model is ready. Scroll down to view insights!")
-    # Display plot
-    st.subheader("🔍 What Influences Churn the Most?")
-    plt.figure(figsize=(10, 6))
-    shap.summary_plot(shap_values.values, X_encoded_df, feature_names=feature_names, show=False)
-    st.pyplot(plt.gcf())
+        explained = len(churn_model['shap_values'])
+        if explained < churn_model['n_rows']:
+            st.caption(
+                f"Explained {explained:,} of {churn_model['n_rows']:,} customers. Each feature's importance "
+                f"is within ±{churn_model['shap_importance_error']:.1%} of the total (95% confidence)."
+            )
 
 st.markdown("---")
 st.write("### What Else We Can Do")
@@ -250,3 +265,5 @@ st.markdown("""
 
 If you’d like a custom analysis on your data, register [here](https://request.holitica.it/) or contact victor@holitica.it. You can also find Holitica on [LinkedIn](https://www.linkedin.com/company/holitica/).
 """)
+
+show_trace_panel()
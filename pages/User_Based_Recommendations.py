@@ -1,18 +1,22 @@
-import pandas as pd
-from surprise import Dataset, Reader, SVD
 import streamlit as st
 
 from shared.form import dataset_form_in_columns
 from shared.const import show_side_bar_with_more
+from shared.store import load_shared_dataset
+from shared.jobs import QueueFullError, job_status, session_owner, show_job_failure, show_job_progress
+from shared.recommend import cached_model, cached_top_n, model_key, recommend, start_model
+from shared.similarity import cached_item_index, similar_items, start_item_index
+from shared.tracing import set_dataset, show_trace_panel, span, start_page
 
+start_page("User Based Recommendations")
 show_side_bar_with_more()
 left, right = st.columns([3, 1])  # Wider left, narrower right
 
 
 # Load and cache data
-@st.cache_data
+# Served from the shared store as a read-only view; no per-session copy
 def load_data():
-    df = pd.read_csv('data/fashion_products.csv')
+    df = load_shared_dataset('data/fashion_products.csv')
     return df
 
 df_default = load_data()
@@ -25,6 +29,7 @@ df = dataset_form_in_columns(
     required_columns=["User ID", "Product ID", "Rating"],
     help_text="File must include columns: User ID, Product ID, Rating"
 )
+set_dataset(df)
 with left:
     st.title("🛍️ Fashion Product Recommender")
     if df is not None:
@@ -47,36 +52,69 @@ with left:
         df_display.index = [''] * len(df_display)
         st.dataframe(df_display.head(3))
 if df is not None:
-    # Prepare Surprise dataset
-    reader = Reader(rating_scale=(df['Rating'].min(), df['Rating'].max()))
-    data = Dataset.load_from_df(df[['User ID', 'Product ID', 'Rating']], reader)
-    train_set = data.build_full_trainset()
-
-    # Train model
-    sim_options = {'name': 'cosine', 'user_based': False}
-    algo = SVD()
-    algo.fit(train_set)
-
-
-    st.markdown("Get personalized product suggestions based on real user ratings.")
-
-    user_ids = df['User ID'].unique()
-    selected_user = st.selectbox("Select a User ID", user_ids)
-
-    # Only compute recommendations if a user is selected
-    if selected_user:
-        all_items = df['Product ID'].unique()
-        user_items = df[df['User ID'] == selected_user]['Product ID'].tolist()
-        items_to_predict = [item for item in all_items if item not in user_items]
-        predictions = [algo.predict(uid=selected_user, iid=item) for item in items_to_predict]
-        top_n = [
-            pred for pred in predictions
-            if not pred.details['was_impossible']
-        ]
-        top_n = sorted(top_n, key=lambda x: x.est, reverse=True)[:5]
-        st.subheader(f"Top 5 Recommendations for User {selected_user}")
-        for pred in top_n:
-            st.markdown(f"- **Product ID:** `{pred.iid}` — _Estimated Rating_: **{pred.est:.2f}**")
+    # Train the model with Surprise's default hyperparameters in the background,
+    # or load it if this dataset was already trained with them; only factors are
+    # kept, so every item is scored for a user with one matrix product. Surprise
+    # is imported by the training job only
+    key = model_key(df)
+    model = cached_model(key)
+    if model is None:
+        try:
+            job_id = start_model(df, owner=session_owner())
+        except QueueFullError as e:
+            st.warning(str(e))
+        else:
+            status = job_status(job_id)
+            if status['state'] == 'done':
+                model = cached_model(key)
+            elif status['state'] == 'failed':
+                show_job_failure(job_id, f"Training failed: {status['message']}",
+                                 lambda: start_model(df, owner=session_owner(), retry=True))
+            else:
+                show_job_progress(job_id, "⏳ Training the recommender...")
+
+    if model is not None:
+        st.markdown("Get personalized product suggestions based on real user ratings.")
+
+        user_ids = df['User ID'].unique()
+        selected_user = st.selectbox("Select a User ID", user_ids)
+
+        # Only compute recommendations if a user is selected
+        if selected_user:
+            # Lists precomputed for the bundled dataset are read; uploads are scored live
+            with span("recommend"):
+                top_n = recommend(model, selected_user, n=5, lists=cached_top_n(key))
+            st.subheader(f"Top 5 Recommendations for User {selected_user}")
+            for iid, est in top_n:
+                st.markdown(f"- **Product ID:** `{iid}` — _Estimated Rating_: **{est:.2f}**")
+
+        # Item-to-item neighbours, built per model in the background and saved next to it
+        st.subheader("Similar Products")
+        similarity_sources = {"Rated by the same users": 'ratings', "Close in the model's taste space": 'factors'}
+        source = similarity_sources[st.radio("Similarity based on", list(similarity_sources), horizontal=True)]
+        with span("item_index", source=source):
+            item_index = cached_item_index(key, source)
+        if item_index is None:
+            try:
+                index_job = start_item_index(key, model, source, owner=session_owner())
+            except QueueFullError as e:
+                st.warning(str(e))
+            else:
+                status = job_status(index_job)
+                if status['state'] == 'done':
+                    item_index = cached_item_index(key, source)
+                elif status['state'] == 'failed':
+                    show_job_failure(index_job, f"Finding similar products failed: {status['message']}",
+                                     lambda: start_item_index(key, model, source, owner=session_owner(), retry=True))
+                else:
+                    show_job_progress(index_job, "⏳ Finding similar products...")
+        if item_index is not None:
+            selected_item = st.selectbox("Select a Product ID", df['Product ID'].unique())
+            neighbours = similar_items(item_index, selected_item, 5)
+            if not neighbours:
+                st.info("No other product is similar to this one.")
+            for iid, similarity in neighbours:
+                st.markdown(f"- **Product ID:** `{iid}` — _Similarity_: **{similarity:.2f}**")
 
 st.markdown("---")
 st.write("### What Else We Can Do")
@@ -91,3 +129,5 @@ st.markdown("""
 
 If you’d like a custom recommendation engine built for your business, register [here](https://request.holitica.it/) or contact victor@holitica.it. You can also find Holitica on [LinkedIn](https://www.linkedin.com/company/holitica/).
 """)
+
+show_trace_panel()
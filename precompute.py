@@ -0,0 +1,107 @@
+"""Build the bundled datasets' derived artifacts ahead of time, e.g. at image build.
+
+Writes to CACHE_DIR (``HOLITICA_CACHE_DIR``) what the pages would otherwise
+compute for their first visitor: the RFM table, segment/product demand
+index and month-end RFM history of the transactions, the SVD factors, top-N
+lists and item neighbours of the ratings, and the churn models with SHAP
+values of the popular feature sets. Artifacts are keyed by dataset hash and format version, so the pages
+pick them up only while both still match; ``precomputed.json`` lists them.
+Uploads are not affected: they are computed live, as before.
+Run from the repository root:
+
+    python precompute.py
+    python precompute.py --selections churn-selections.json   # feature sets picked in production
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+from shared.cache import CACHE_DIR, dataset_hash
+from shared.churn import CHURN_FORMAT_VERSION, SELECTIONS_FILE, get_churn_model, prepare_churn_data, warm_feature_sets
+from shared.insights import INSIGHTS_FORMAT_VERSION, get_insights, get_rfm_history, month_end_snapshots
+from shared.recommend import (
+    MODEL_FORMAT_VERSION, TOP_N, cache_model, cached_model, model_key, save_top_n, top_n_lists, train_svd_model,
+    training_args,
+)
+from shared.similarity import INDEX_FORMAT_VERSION, get_item_index
+from shared.store import load_shared_dataset
+
+TRANSACTIONS = 'data/simulated_transactions.csv'
+RATINGS = 'data/fashion_products.csv'
+CHURN = 'data/churn.csv'
+MANIFEST = 'precomputed.json'
+# Neighbour sources the recommender page offers
+SIMILARITY_SOURCES = ['ratings', 'factors']
+
+
+def _timed(artifacts, name, df, build):
+    start = time.perf_counter()
+    build()
+    seconds = time.perf_counter() - start
+    artifacts.append({'artifact': name, 'dataset': dataset_hash(df), 'rows': len(df), 'seconds': round(seconds, 3)})
+    print(f"{name:<40} {seconds:7.2f}s")
+
+
+def precompute_insights(artifacts):
+    df = load_shared_dataset(TRANSACTIONS)
+    _timed(artifacts, 'rfm + demand index', df, lambda: get_insights(df))
+    # The page's segment transitions
+    snapshots = month_end_snapshots(get_insights(df)[0]['InvoiceDate'])
+    _timed(artifacts, f'rfm history ({len(snapshots)} snapshots)', df, lambda: get_rfm_history(df, snapshots))
+
+
+def precompute_recommender(artifacts):
+    df = load_shared_dataset(RATINGS)
+    # The page's model: Surprise's default hyperparameters
+    key = model_key(df)
+
+    def train():
+        if cached_model(key) is None:
+            cache_model(key, train_svd_model(*training_args(df)))
+
+    _timed(artifacts, 'svd factors', df, train)
+    model = cached_model(key)
+    _timed(artifacts, f'top-{TOP_N} lists', df, lambda: save_top_n(key, top_n_lists(model)))
+    for source in SIMILARITY_SOURCES:
+        _timed(artifacts, f'item neighbours ({source})', df, lambda: get_item_index(key, model, source))
+
+
+def precompute_churn(artifacts):
+    df = prepare_churn_data(load_shared_dataset(CHURN))
+    # The page's default modes: standard training, SHAP on a sample
+    for columns in warm_feature_sets(df):
+        _timed(artifacts, f'churn model ({len(columns)} features)', df, lambda: get_churn_model(df, columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--selections', help=f"a {SELECTIONS_FILE} whose most picked churn feature sets to train too")
+    args = parser.parse_args(argv)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    if args.selections:
+        shutil.copyfile(args.selections, os.path.join(CACHE_DIR, SELECTIONS_FILE))
+    artifacts = []
+    precompute_insights(artifacts)
+    precompute_recommender(artifacts)
+    precompute_churn(artifacts)
+
+    manifest = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'versions': {
+            'insights': INSIGHTS_FORMAT_VERSION,
+            'svd': MODEL_FORMAT_VERSION,
+            'item_index': INDEX_FORMAT_VERSION,
+            'churn': CHURN_FORMAT_VERSION,
+        },
+        'artifacts': artifacts,
+    }
+    with open(os.path.join(CACHE_DIR, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"{len(artifacts)} artifacts in {CACHE_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Trained models and other derived artifacts saved across restarts
+CACHE_DIR = os.getenv("HOLITICA_CACHE_DIR", ".cache")
+# Size cap of the artifacts in CACHE_DIR; past it the least recently used go
+CACHE_MAX_MB = int(os.getenv("HOLITICA_CACHE_MAX_MB", "4096"))
+# Artifact files prune_cache_dir may remove; others (the churn feature-set
+# selections, the precompute manifest) are left alone
+CACHE_SUFFIXES = (".joblib", ".npz")
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def touch(path):
+    """Mark a file in CACHE_DIR as just used, so ``prune_cache_dir`` removes it last."""
+    try:
+        os.utime(path)
+    except OSError:
+        # Gone already, or a read-only cache (e.g. baked into an image)
+        pass
+
+
+def prune_cache_dir(keep=None):
+    """Remove the least recently used artifacts until CACHE_DIR fits in ``CACHE_MAX_MB``.
+
+    Files are ordered by mtime, which saving and ``touch`` on load update;
+    ``keep`` (the file just written) and files being written are never removed.
+    """
+    files = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith(CACHE_SUFFIXES) and ".tmp" not in entry.name:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= CACHE_MAX_MB * 1024 * 1024:
+            break
+        if path == keep:
+            continue
+        total -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another process pruned it first
+            pass
+
+
+def dataset_hash(df):
+    """Content hash of the dataset a frame was loaded from.
+
+    Uploads are tagged with the hash of the uploaded bytes; other frames are
+    hashed from their values once and tagged. Derived artifacts (RFM tables,
+    models, figures) can use it as a cache key.
+    """
+    if 'dataset_hash' not in df.attrs:
+        row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+        columns = ','.join(map(str, df.columns)).encode()
+        df.attrs['dataset_hash'] = content_hash(row_hashes.tobytes() + columns)
+    return df.attrs['dataset_hash']
+
+
+def frame_nbytes(df):
+    """In-memory size of a DataFrame, including the contents of string columns."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache.
+
+    Bounded by the number of entries and, when ``sizeof`` is given, by the total
+    size of the cached values in bytes. The cache lives at module level in the
+    modules that use it, so it is shared by every Streamlit session in the
+    process.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                # Larger than the whole budget: serve it uncached
+                self._entries.pop(key, None)
+                self._sizes.pop(key, None)
+                return value
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._evict()
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            self._sizes.pop(key, None)
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and sum(self._sizes.values()) > self.max_bytes
+        ):
+            key, _ = self._entries.popitem(last=False)
+            self._sizes.pop(key, None)
@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+from collections import Counter
+
+import joblib
+
+from shared.cache import CACHE_DIR, LRUCache, content_hash, dataset_hash, prune_cache_dir, touch
+from shared.explain import SHAP_SAMPLE_ROWS
+from shared.jobs import QueueFullError, submit
+
+TARGET = "Churn"
+CHURN_PARAMS = {"use_label_encoder": False, "eval_metric": "logloss", "random_state": 42}
+# Fast mode for large uploads: histogram trees on natively categorical
+# features (no one-hot matrix), stopped early on a validation split or when
+# the wall-clock budget runs out. time_budget_s is ours, the rest XGBoost's
+FAST_CHURN_PARAMS = {
+    "tree_method": "hist", "enable_categorical": True, "max_cat_to_onehot": 1,
+    "n_estimators": 100, "learning_rate": 0.3, "early_stopping_rounds": 10,
+    "eval_metric": "logloss", "random_state": 42,
+    "time_budget_s": float(os.getenv("HOLITICA_CHURN_TIME_BUDGET", "60")),
+}
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+# Share of the training rows held out for early stopping
+VALIDATION_SIZE = 0.1
+
+# Fitted pipelines with their encoded training matrix and SHAP values, in
+# memory and as joblib files under CACHE_DIR
+CHURN_CACHE_MAX_ENTRIES = 16
+CHURN_CACHE_MAX_MB = 512
+# Bump when the cached contents change so stale files are not loaded
+CHURN_FORMAT_VERSION = 4
+# Feature sets trained at startup before anyone has picked one: the features
+# the page has insights for
+DEFAULT_FEATURE_SETS = [
+    ["gender", "Dependents", "tenure", "PhoneService", "InternetService",
+     "OnlineSecurity", "OnlineBackup", "TechSupport", "Contract"],
+]
+# Most frequently picked feature sets warmed at startup
+WARM_TOP_SELECTIONS = 3
+SELECTIONS_FILE = "churn-selections.json"
+
+
+def churn_model_nbytes(entry):
+    return int(entry['X_encoded'].nbytes + entry['shap_values'].nbytes)
+
+
+_models = LRUCache(CHURN_CACHE_MAX_ENTRIES, CHURN_CACHE_MAX_MB * 1024 * 1024, sizeof=churn_model_nbytes)
+_training = {}
+_lock = threading.Lock()
+_warmed = set()
+
+
+def prepare_churn_data(df):
+    """The churn table as the page models it: no saved index column, SeniorCitizen as a category."""
+    # Drop index column if present
+    if "Unnamed: 0" in df.columns:
+        df = df.drop(columns=["Unnamed: 0"])
+    # Treat 'SeniorCitizen' as categorical
+    df['SeniorCitizen'] = df['SeniorCitizen'].astype(str)
+    return df
+
+
+def canonical_columns(df, columns):
+    """``columns`` in the order of ``df``, so any order of the same picks is one model."""
+    picked = set(columns)
+    return [col for col in df.columns if col in picked]
+
+
+def churn_model_key(df, columns, params=CHURN_PARAMS, shap_rows=SHAP_SAMPLE_ROWS):
+    key = [dataset_hash(df), sorted(columns), params, shap_rows, CHURN_FORMAT_VERSION]
+    return content_hash(json.dumps(key, sort_keys=True).encode())
+
+
+def train_churn_model(*args, **kwargs):
+    """``shared.churn_train.train_churn_model``, which imports sklearn, XGBoost and SHAP.
+
+    Submitted jobs pickle this function, not that one, so the ML stack is only
+    loaded by the worker that trains.
+    """
+    from shared.churn_train import train_churn_model
+    return train_churn_model(*args, **kwargs)
+
+
+def _model_path(key):
+    return os.path.join(CACHE_DIR, f"churn-{key}.joblib")
+
+
+def _key_lock(key):
+    with _lock:
+        return _training.setdefault(key, threading.Lock())
+
+
+def _load(key):
+    entry = _models.get(key)
+    if entry is None and os.path.exists(_model_path(key)):
+        entry = _models.put(key, joblib.load(_model_path(key)))
+        touch(_model_path(key))
+    return entry
+
+
+def _save(key, entry):
+    path = _model_path(key)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(entry, tmp)
+    os.replace(tmp, path)
+    prune_cache_dir(keep=path)
+    return _models.put(key, entry)
+
+
+def cached_churn_model(df, columns, params=CHURN_PARAMS, shap_rows=SHAP_SAMPLE_ROWS):
+    """Churn model for ``columns`` if it is in memory or on disk, else None."""
+    return _load(churn_model_key(df, canonical_columns(df, columns), params, shap_rows))
+
+
+def get_churn_model(df, columns, params=CHURN_PARAMS, shap_rows=SHAP_SAMPLE_ROWS):
+    """Churn model for ``columns`` from memory, disk, or by training it here.
+
+    Concurrent requests for the same model wait for one training run.
+    """
+    columns = canonical_columns(df, columns)
+    key = churn_model_key(df, columns, params, shap_rows)
+    entry = _load(key)
+    if entry is not None:
+        return entry
+    with _key_lock(key):
+        return _load(key) or _save(key, train_churn_model(df, columns, params, shap_rows))
+
+
+def start_churn_model(df, columns, params=CHURN_PARAMS, shap_rows=SHAP_SAMPLE_ROWS, owner=None, retry=False):
+    """Train the churn model in the job pool; returns the job id (the model key).
+
+    Identical requests from any session share one job. When it finishes the
+    model is cached, so ``cached_churn_model`` returns it. A failed job is
+    only run again with ``retry``.
+    """
+    columns = canonical_columns(df, columns)
+    key = churn_model_key(df, columns, params, shap_rows)
+    # Checked without loading: unpickling a saved pipeline imports sklearn and XGBoost
+    if key not in _models and not os.path.exists(_model_path(key)):
+        # Only the needed columns travel to the worker
+        submit(key, train_churn_model, df[columns + [TARGET]], columns, params, shap_rows,
+               owner=owner, on_done=lambda entry: _save(key, entry), retry=retry)
+    return key
+
+
+def _selections_path():
+    return os.path.join(CACHE_DIR, SELECTIONS_FILE)
+
+
+def load_selections():
+    try:
+        with open(_selections_path()) as f:
+            return Counter({tuple(json.loads(key)): count for key, count in json.load(f).items()})
+    except (OSError, ValueError):
+        return Counter()
+
+
+def record_selection(df, columns):
+    """Count a picked feature set, so the popular ones are warmed on the next start."""
+    columns = tuple(canonical_columns(df, columns))
+    with _lock:
+        counts = load_selections()
+        counts[columns] += 1
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{_selections_path()}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({json.dumps(list(key)): count for key, count in counts.items()}, f)
+        os.replace(tmp, _selections_path())
+
+
+def warm_feature_sets(df, top=WARM_TOP_SELECTIONS):
+    """Most picked feature sets, then the defaults, limited to columns ``df`` has."""
+    picked = [list(columns) for columns, _ in load_selections().most_common(top)]
+    feature_sets = []
+    for columns in picked + DEFAULT_FEATURE_SETS:
+        columns = canonical_columns(df, columns)
+        if columns and columns not in feature_sets:
+            feature_sets.append(columns)
+    return feature_sets
+
+
+def warm_churn_models(df, top=WARM_TOP_SELECTIONS):
+    """Queue the likely feature sets in the job pool, once per dataset; returns the job ids."""
+    key = dataset_hash(df)
+    with _lock:
+        if key in _warmed:
+            return []
+        _warmed.add(key)
+    jobs = []
+    for columns in warm_feature_sets(df, top):
+        try:
+            jobs.append(start_churn_model(df, columns))
+        except QueueFullError:
+            break
+    return jobs
@@ -0,0 +1,155 @@
+import time
+
+import numpy as np
+import pandas as pd
+import shap
+from sklearn.compose import ColumnTransformer
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+from xgboost import XGBClassifier
+from xgboost.callback import TrainingCallback
+
+from shared.churn import CHURN_PARAMS, SPLIT_SEED, TARGET, TEST_SIZE, VALIDATION_SIZE
+from shared.explain import SHAP_SAMPLE_ROWS, SHAP_WORKERS, relative_importance_error, stratified_sample, tree_shap
+from shared.jobs import JOB_THREADS, report_progress
+from shared.tracing import span
+
+# The training half of shared/churn.py, imported by the job workers and the
+# benchmarks: the page schedules training without loading sklearn, XGBoost or
+# SHAP (unpickling a finished pipeline still loads the first two).
+
+
+class TimeBudget(TrainingCallback):
+    """Stop boosting once ``seconds`` of wall-clock time have passed."""
+
+    def __init__(self, seconds):
+        super().__init__()
+        self.seconds = seconds
+        self.exceeded = False
+
+    def before_training(self, model):
+        self.started = time.perf_counter()
+        return model
+
+    def after_iteration(self, model, epoch, evals_log):
+        self.exceeded = time.perf_counter() - self.started > self.seconds
+        return self.exceeded
+
+
+
+def train_churn_model(df, columns, params=CHURN_PARAMS, shap_rows=SHAP_SAMPLE_ROWS, workers=SHAP_WORKERS):
+    """Fit the churn pipeline on ``columns`` and explain it on the training rows.
+
+    With ``shap_rows`` set, a stratified sample of that many training rows is
+    explained with XGBoost's tree SHAP, so the cost stops growing with the
+    dataset; ``shap_importance_error`` then bounds the error of the feature
+    importance. ``shap_rows=None`` explains every training row with
+    ``shap.Explainer`` (interventional SHAP over a background sample), or with
+    tree SHAP for natively categorical models, which it cannot read.
+
+    With ``enable_categorical`` in ``params`` (``FAST_CHURN_PARAMS``) the
+    categories are ordinal-encoded and split on natively, one feature per
+    column; ``early_stopping_rounds`` stops on a validation split taken from
+    the training rows and ``time_budget_s`` caps the boosting time.
+
+    Returns the fitted pipeline, the explained rows of the encoded training
+    matrix (and their positions) with its feature names, their SHAP values,
+    and the training time and accuracy on the test split.
+    """
+    report_progress(0.05, "Preparing features")
+    params = dict(params)
+    time_budget = params.pop("time_budget_s", None)
+    native_categorical = params.get("enable_categorical", False)
+    X = df[columns]
+    y = df[TARGET]
+
+    # Identify column types
+    cat_cols = X.select_dtypes(include=["object", "category"]).columns.tolist()
+    num_cols = X.select_dtypes(exclude=["object", "category"]).columns.tolist()
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=TEST_SIZE, random_state=SPLIT_SEED, stratify=y
+    )
+
+    if native_categorical:
+        encoder = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=np.nan)
+        params["feature_types"] = ["c"] * len(cat_cols) + ["q"] * len(num_cols)
+    else:
+        encoder = OneHotEncoder(handle_unknown="ignore", drop=None)
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ("cat", encoder, cat_cols)
+        ],
+        remainder="passthrough"
+    )
+    budget = None
+    if time_budget is not None:
+        budget = TimeBudget(time_budget)
+        params["callbacks"] = [budget]
+    clf = Pipeline(steps=[
+        ("preprocessor", preprocessor),
+        ("classifier", XGBClassifier(**{"n_jobs": JOB_THREADS, **params}))
+    ])
+    fit_params = {}
+    X_fit, y_fit = X_train, y_train
+    if "early_stopping_rounds" in params:
+        X_fit, X_valid, y_fit, y_valid = train_test_split(
+            X_train, y_train, test_size=VALIDATION_SIZE, random_state=SPLIT_SEED, stratify=y_train
+        )
+        X_valid = preprocessor.fit(X_fit).transform(X_valid)
+        fit_params = {"classifier__eval_set": [(X_valid, y_valid)], "classifier__verbose": False}
+    report_progress(0.1, "Training model")
+    start = time.perf_counter()
+    with span("xgboost_fit", X_fit):
+        clf.fit(X_fit, y_fit, **fit_params)
+    train_seconds = time.perf_counter() - start
+    accuracy = float(clf.score(X_test, y_test))
+    report_progress(0.5, "Explaining predictions")
+
+    # Encoded feature names: one-hot columns (or the categorical columns
+    # themselves) first, then the passed-through numbers
+    classifier = clf.named_steps["classifier"]
+    if native_categorical:
+        feature_names = cat_cols + num_cols
+    else:
+        ohe = preprocessor.named_transformers_['cat']
+        feature_names = list(ohe.get_feature_names_out(cat_cols)) + num_cols
+    booster = classifier.get_booster()
+    if "early_stopping_rounds" in params:
+        # Explain the trees predict uses, not the ones boosted past the best round
+        booster = booster[:classifier.best_iteration + 1]
+
+    X_encoded = preprocessor.transform(X_train)
+    n_rows = X_encoded.shape[0]
+    rows = np.arange(n_rows)
+    with span("shap") as traced_span:
+        if shap_rows is None and not native_categorical:
+            X_encoded_df = pd.DataFrame(X_encoded, columns=feature_names)
+            explainer = shap.Explainer(classifier, X_encoded_df)
+            shap_values = explainer(X_encoded_df).values
+            importance_error = 0.0
+        elif shap_rows is None:
+            shap_values, _ = tree_shap(booster, X_encoded, workers)
+            importance_error = 0.0
+        else:
+            rows = stratified_sample(y_train, shap_rows, seed=SPLIT_SEED)
+            X_encoded = X_encoded[rows]
+            shap_values, _ = tree_shap(booster, X_encoded, workers)
+            importance_error = relative_importance_error(shap_values)
+        traced_span.tag(rows=len(shap_values))
+    return {
+        'pipeline': clf,
+        'feature_names': feature_names,
+        'X_encoded': X_encoded,
+        'shap_values': shap_values,
+        # Positions of the explained rows among the training rows
+        'rows': rows,
+        'n_rows': n_rows,
+        'shap_importance_error': importance_error,
+        'train_seconds': train_seconds,
+        'accuracy': accuracy,
+        'n_test': len(y_test),
+        'n_trees': booster.num_boosted_rounds(),
+        'time_budget_hit': bool(budget is not None and budget.exceeded),
+    }
@@ -1,4 +1,3 @@
-from PIL import Image
 import streamlit as st
 vip_label = 'VIP'
 others_label = 'Others'
@@ -7,7 +6,10 @@ SLOGAN="""
 Connecting Marketing, Technology and Data
 """
 
-logo = Image.open("holitica-slogan-logo.png")
+# Read once per process and shared by every page and session. st.image serves
+# PNG bytes as they are; a decoded PIL image was re-encoded on every page run
+with open("holitica-slogan-logo.png", "rb") as f:
+    logo = f.read()
 
 def show_side_bar_with_more():
     with st.sidebar:
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from shared.tracing import traced
+
+# Products kept per segment for the recommendation widget
+TOP_N = 10
+
+
+@traced()
+def build_demand_index(df_merged, segment_field='Segment', product_field='Description',
+                       customer_field='CustomerID', quantity_field='Quantity', top_n=TOP_N):
+    """Precompute everything the Retail page looks up per interaction.
+
+    - ``demand``: segment x product quantity cube, stored long (only observed pairs)
+    - ``top_products``: the top ``top_n`` products of each segment
+    - ``purchased``: sparse customer x product matrix of who bought what
+    - ``customers_by_segment`` / ``segments``: selectbox options in order of appearance
+    """
+    demand = df_merged.groupby([segment_field, product_field], observed=True)[quantity_field].sum()
+    top_products = {
+        segment: demand.xs(segment, level=segment_field).sort_values(ascending=False).head(top_n)
+        for segment in demand.index.get_level_values(segment_field).unique()
+    }
+
+    customer_codes, customers = pd.factorize(df_merged[customer_field])
+    product_codes, products = pd.factorize(df_merged[product_field])
+    purchased = sparse.csr_matrix(
+        (np.ones(len(df_merged), dtype=bool), (customer_codes, product_codes)),
+        shape=(len(customers), len(products)),
+    )
+
+    first_orders = df_merged.drop_duplicates(customer_field)
+    customers_by_segment = {
+        segment: group[customer_field].to_numpy()
+        for segment, group in first_orders.groupby(segment_field, sort=False)
+    }
+    return {
+        'demand': demand,
+        'top_products': top_products,
+        'purchased': purchased,
+        'customers': pd.Index(customers),
+        'products': pd.Index(products),
+        'customers_by_segment': customers_by_segment,
+        'segments': df_merged[segment_field].unique(),
+        'segment_field': segment_field,
+        'product_field': product_field,
+    }
+
+
+def top_products_for(index, segments, n=TOP_N, exclude=False):
+    """Top ``n`` products by quantity over ``segments`` (or all other segments if ``exclude``)."""
+    demand = index['demand']
+    in_segments = demand.index.get_level_values(index['segment_field']).isin(segments)
+    selected = demand[~in_segments if exclude else in_segments]
+    totals = selected.groupby(level=index['product_field'], observed=True).sum()
+    return totals.sort_values(ascending=False).head(n)
+
+
+def customer_products(index, customer_id):
+    """Products the customer has bought, from one sparse row."""
+    row = index['customers'].get_loc(customer_id)
+    purchased = index['purchased']
+    return index['products'][purchased.indices[purchased.indptr[row]:purchased.indptr[row + 1]]]
+
+
+def recommend_for_customer(index, segment, customer_id):
+    """Products popular in the segment that the customer has not bought yet."""
+    top_products = index['top_products'][segment]
+    return top_products[~top_products.index.isin(customer_products(index, customer_id))]
@@ -0,0 +1,100 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Rows explained in the fast mode; cost is linear in it, so it caps the latency
+SHAP_SAMPLE_ROWS = 2000
+# Worker processes for tree SHAP (1: in-process, XGBoost still uses its threads)
+SHAP_WORKERS = int(os.getenv("HOLITICA_SHAP_WORKERS", "1"))
+# Rows per task when tree SHAP runs in worker processes
+SHAP_CHUNK_ROWS = 50_000
+# Two-sided 95% normal quantile for the importance error bars
+Z_95 = 1.96
+
+
+def stratified_sample(y, n, seed=0):
+    """Sorted row positions of a sample of size ``n`` with the class shares of ``y``."""
+    y = np.asarray(y)
+    if len(y) <= n:
+        return np.arange(len(y))
+    rng = np.random.default_rng(seed)
+    rows = []
+    for cls in np.unique(y):
+        members = np.flatnonzero(y == cls)
+        take = max(1, round(n * len(members) / len(y)))
+        rows.append(rng.choice(members, min(take, len(members)), replace=False))
+    return np.sort(np.concatenate(rows))
+
+
+def _contributions(raw_model, X):
+    import xgboost as xgb
+
+    booster = xgb.Booster()
+    booster.load_model(bytearray(raw_model))
+    return booster.predict(_matrix(booster, X), pred_contribs=True)
+
+
+def _matrix(booster, X):
+    # Imported here so the churn page can read SHAP_SAMPLE_ROWS without loading XGBoost
+    import xgboost as xgb
+
+    # Natively categorical models need their feature types to follow category splits
+    return xgb.DMatrix(X, feature_types=booster.feature_types, enable_categorical='c' in (booster.feature_types or []))
+
+
+def tree_shap(booster, X, workers=SHAP_WORKERS, chunk_rows=SHAP_CHUNK_ROWS):
+    """Path-dependent tree SHAP values and the expected value, from XGBoost itself.
+
+    With ``workers > 1`` the rows are split into chunks explained in separate
+    processes (each loads the booster from its serialized form).
+    """
+    if workers > 1 and X.shape[0] > chunk_rows:
+        raw_model = booster.save_raw()
+        chunks = [X[start:start + chunk_rows] for start in range(0, X.shape[0], chunk_rows)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            contributions = np.vstack(list(pool.map(_contributions, [raw_model] * len(chunks), chunks)))
+    else:
+        contributions = booster.predict(_matrix(booster, X), pred_contribs=True)
+    # The last column is the bias term: the same expected value for every row
+    return contributions[:, :-1], float(contributions[0, -1])
+
+
+def importance_error(shap_values):
+    """Mean |SHAP| per feature with the half-width of its 95% confidence interval.
+
+    On a sample this bounds how far each feature's importance (the ranking the
+    summary plot shows) can be from the importance over all rows.
+    """
+    magnitude = np.abs(shap_values)
+    importance = magnitude.mean(axis=0)
+    if len(magnitude) < 2:
+        return importance, np.full_like(importance, np.nan)
+    return importance, Z_95 * magnitude.std(axis=0, ddof=1) / np.sqrt(len(magnitude))
+
+
+def relative_importance_error(shap_values):
+    """Largest 95% error bar relative to the total importance, as one number to report."""
+    importance, error = importance_error(shap_values)
+    return float(error.max() / importance.sum()) if importance.sum() else 0.0
+
+
+def compare_shap(approximate, exact, approximate_rows=None):
+    """Error of budgeted SHAP values against exact ones.
+
+    ``exact`` covers every row; ``approximate`` covers ``approximate_rows`` of
+    them (default: all). Returns the value error on the shared rows and the
+    error of the per-feature importance, both relative to the exact total
+    importance, plus whether the importance ranking is unchanged.
+    """
+    exact_importance = np.abs(exact).mean(axis=0)
+    approx_importance = np.abs(approximate).mean(axis=0)
+    shared = exact if approximate_rows is None else exact[approximate_rows]
+    scale = exact_importance.sum() or 1.0
+    return {
+        'max_value_error': float(np.abs(approximate - shared).max() / scale),
+        'mean_value_error': float(np.abs(approximate - shared).mean() / scale),
+        'max_importance_error': float(np.abs(approx_importance - exact_importance).max() / scale),
+        'same_ranking': bool(np.array_equal(
+            np.argsort(-approx_importance, kind='stable'), np.argsort(-exact_importance, kind='stable'))),
+    }
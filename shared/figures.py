@@ -0,0 +1,87 @@
+import io
+import json
+
+import numpy as np
+
+from shared.cache import LRUCache, content_hash
+from shared.tracing import span
+
+# Rendered figures as image bytes, keyed by the data they show and the plot
+# parameters, so a rerun or another session shows them without drawing again
+FIGURE_CACHE_MAX_ENTRIES = 128
+FIGURE_CACHE_MAX_MB = 64
+# st.pyplot's resolution, lowered for wide figures: Streamlit resizes images
+# wider than this on every display, which would undo the cache
+FIGURE_DPI = 200
+FIGURE_MAX_WIDTH_PX = 1460
+# Most points a beeswarm draws; past a few thousand more only add overplotting
+# while the drawing time keeps growing with them
+BEESWARM_MAX_POINTS = 2000
+
+_figures = LRUCache(FIGURE_CACHE_MAX_ENTRIES, FIGURE_CACHE_MAX_MB * 1024 * 1024, sizeof=len)
+
+
+def figure_key(*parts):
+    """Cache key of a figure from its inputs and parameters (JSON-serializable, small)."""
+    return content_hash(json.dumps(parts, sort_keys=True, default=str).encode())
+
+
+def render(fig, fmt="png"):
+    """``fig`` as PNG or SVG bytes, cropped like st.pyplot; the figure is closed."""
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    dpi = min(FIGURE_DPI, FIGURE_MAX_WIDTH_PX / fig.get_figwidth())
+    fig.savefig(buffer, format=fmt, bbox_inches="tight", dpi=dpi)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def cached_figure(key, draw, fmt="png"):
+    """Bytes of the figure ``draw()`` returns, drawn and rendered once per ``key``.
+
+    Show PNGs with ``st.image(data, use_container_width=True)``; on a hit
+    neither the plotting libraries nor ``draw`` are touched.
+    """
+    data = _figures.get((key, fmt))
+    if data is None:
+        with span("render_figure", format=fmt):
+            data = _figures.put((key, fmt), render(draw(), fmt))
+    return data
+
+
+def beeswarm_rows(shap_values, max_points=BEESWARM_MAX_POINTS):
+    """Sorted positions of at most ``max_points`` rows that keep the spread of the predictions.
+
+    Rows are ordered by their total SHAP value (the model output less the
+    base value) and taken at evenly spaced ranks, so every quantile of the
+    predictions keeps its share and both extremes are drawn.
+    """
+    n_rows = len(shap_values)
+    if n_rows <= max_points:
+        return np.arange(n_rows)
+    order = np.argsort(shap_values.sum(axis=1), kind="stable")
+    return np.sort(order[np.linspace(0, n_rows - 1, max_points).round().astype(int)])
+
+
+def shap_summary_png(key, shap_values, X, feature_names, max_points=BEESWARM_MAX_POINTS):
+    """SHAP summary (beeswarm) plot as PNG bytes, cached under ``key`` and ``max_points``.
+
+    Features are ranked by their mean |SHAP| over every row, then at most
+    ``max_points`` rows are drawn (see ``beeswarm_rows``), so the drawing time
+    stays flat however many rows were explained.
+    """
+    def draw():
+        import matplotlib.pyplot as plt
+        import pandas as pd
+        import shap
+
+        order = np.argsort(-np.abs(shap_values).mean(axis=0), kind="stable")
+        rows = beeswarm_rows(shap_values, max_points)
+        names = [feature_names[i] for i in order]
+        X_drawn = pd.DataFrame(X[rows][:, order], columns=names)
+        fig = plt.figure(figsize=(10, 6))
+        shap.summary_plot(shap_values[rows][:, order], X_drawn, feature_names=names, sort=False, show=False)
+        return fig
+
+    return cached_figure(figure_key("shap_summary", key, list(feature_names), max_points), draw)
@@ -11,6 +11,11 @@ import re
 import streamlit.components.v1 as components
 import requests
 
+from shared.cache import LRUCache, content_hash, frame_nbytes
+from shared.ingest import read_upload, MissingColumnsError, UPLOAD_TYPES
+from shared.schema import compact_frame
+from shared.store import get_frame, put_frame
+
 CALL = """
 
 #### 💡 Try it on Your Own Data!
@@ -21,11 +26,49 @@ EMAIL_SENDER = os.getenv("EMAIL_SENDER")       # e.g., you@yourdomain.com
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")   # App password or regular password
 EMAIL_RECEIVER = os.getenv("EMAIL_RECEIVER")   # Could be same as sender
 
+# Upload size limit; keep server.maxUploadSize in .streamlit/config.toml at least as large
+MAX_UPLOAD_MB = 500
+
+# Parsed uploads, keyed by content hash and shared by all sessions in the process
+UPLOAD_CACHE_MAX_ENTRIES = 16
+UPLOAD_CACHE_MAX_MB = 512
+_upload_cache = LRUCache(
+    max_entries=UPLOAD_CACHE_MAX_ENTRIES,
+    max_bytes=UPLOAD_CACHE_MAX_MB * 1024 * 1024,
+    sizeof=frame_nbytes,
+)
+# Session state entry mapping each upload's file_id to its content hash
+UPLOAD_KEYS = 'upload_keys'
+
+def read_uploaded_file(uploaded_file, required_columns=None):
+    """Parse an upload once per distinct content; later calls reuse the cached frame.
+
+    CSV, Parquet and Feather are accepted (see shared/ingest.py). The parsed
+    frame goes to the shared store (see shared/store.py), so other server
+    processes map it instead of parsing it again. Returns a shallow copy so
+    callers can add or replace columns without touching the cached frame.
+    The content hash is kept per upload in the session, so reruns do not hash
+    the file again.
+    """
+    keys = st.session_state.setdefault(UPLOAD_KEYS, {})
+    key = keys.get(uploaded_file.file_id)
+    if key is None:
+        key = keys[uploaded_file.file_id] = content_hash(uploaded_file.getvalue())
+    df = _upload_cache.get(key)
+    if df is None:
+        # Another session or server process may have stored it already
+        df = get_frame(key)
+        if df is None:
+            data = uploaded_file.getvalue()
+            df = put_frame(key, compact_frame(read_upload(data, required_columns)))
+        _upload_cache.put(key, df)
+    return df.copy(deep=False)
+
 def dataset_form_in_columns(
     right,
     default_df,
     required_columns=None,
-    max_size_mb=5,
+    max_size_mb=MAX_UPLOAD_MB,
     help_text=None,
     default_name="Default dataset"
 ):
@@ -38,7 +81,7 @@ def dataset_form_in_columns(
         if choice == default_name:
             return default_df
 
-        uploaded_file = st.file_uploader("Upload a CSV file", type="csv")
+        uploaded_file = st.file_uploader("Upload a CSV, Parquet or Feather file", type=UPLOAD_TYPES)
         if help_text:
             st.info(help_text)
 
@@ -52,9 +95,12 @@ def dataset_form_in_columns(
             return None
 
         try:
-            df = pd.read_csv(uploaded_file)
+            df = read_uploaded_file(uploaded_file, required_columns)
+        except MissingColumnsError as e:
+            st.error(str(e))
+            return None
         except Exception as e:
-            st.error(f"Failed to read CSV: {e}")
+            st.error(f"Failed to read file: {e}")
             return None
 
         if required_columns:
@@ -66,8 +112,8 @@ def dataset_form_in_columns(
         st.success("✅ File successfully loaded")
         return df
 
-def validate_uploaded_file(uploaded_file, required_columns=None, max_size_mb=5):
-    """Validates uploaded CSV file for size and required columns."""
+def validate_uploaded_file(uploaded_file, required_columns=None, max_size_mb=MAX_UPLOAD_MB):
+    """Validates uploaded CSV, Parquet or Feather file for size and required columns."""
     if uploaded_file is None:
         st.warning("Please upload a file.")
         return None
@@ -80,7 +126,10 @@ def validate_uploaded_file(uploaded_file, required_columns=None, max_size_mb=5):
 
     # Read file
     try:
-        df = pd.read_csv(uploaded_file)
+        df = read_uploaded_file(uploaded_file, required_columns)
+    except MissingColumnsError as e:
+        st.error(str(e))
+        return None
     except Exception as e:
         st.error(f"Could not read file: {e}")
         return None
@@ -0,0 +1,115 @@
+import csv
+import io
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from shared.tracing import span
+
+UPLOAD_TYPES = ["csv", "parquet", "feather", "arrow"]
+
+PARQUET_MAGIC = b"PAR1"
+ARROW_MAGIC = b"ARROW1"
+
+# Bytes of a CSV parsed up front to infer column types
+SAMPLE_BYTES = 1024 * 1024
+# String columns whose sample has at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+BLOCK_SIZE = 16 * 1024 * 1024
+TIMESTAMP_PARSERS = [pa_csv.ISO8601, "%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M", "%m/%d/%Y %H:%M"]
+
+
+class MissingColumnsError(ValueError):
+    def __init__(self, columns):
+        super().__init__(f"Missing required columns: {', '.join(columns)}")
+        self.columns = columns
+
+
+def detect_format(data):
+    if data[:4] == PARQUET_MAGIC:
+        return "parquet"
+    if data[:6] == ARROW_MAGIC:
+        return "feather"
+    return "csv"
+
+
+def read_header(data, fmt):
+    """Column names of an upload, without parsing its body."""
+    if fmt == "parquet":
+        return pq.read_schema(io.BytesIO(data)).names
+    if fmt == "feather":
+        return pa.ipc.open_file(pa.BufferReader(data)).schema.names
+    first_line = data[:data.find(b"\n") if b"\n" in data else len(data)]
+    return next(csv.reader([first_line.decode("utf-8-sig").rstrip("\r")]), [])
+
+
+def _csv_sample(data):
+    if len(data) <= SAMPLE_BYTES:
+        return data
+    # Cut at the last complete line
+    return data[:data.rfind(b"\n", 0, SAMPLE_BYTES) + 1]
+
+
+def infer_csv_types(data):
+    """Column types to pin before parsing the whole CSV.
+
+    Dates and integers are left to Arrow's inference on the first block; string
+    columns with few distinct values in the sample are dictionary-encoded so
+    they load as categoricals instead of Python strings.
+    """
+    sample = pa_csv.read_csv(
+        pa.BufferReader(_csv_sample(data)),
+        convert_options=pa_csv.ConvertOptions(timestamp_parsers=TIMESTAMP_PARSERS),
+    )
+    types = {}
+    for name, column in zip(sample.column_names, sample.columns):
+        if pa.types.is_string(column.type) and len(column):
+            if len(column.unique()) <= CATEGORY_MAX_RATIO * len(column):
+                types[name] = pa.dictionary(pa.int32(), pa.string())
+    return types
+
+
+def read_table(data, fmt):
+    if fmt == "parquet":
+        table = pq.read_table(io.BytesIO(data))
+    elif fmt == "feather":
+        table = feather.read_table(pa.BufferReader(data))
+    else:
+        table = pa_csv.read_csv(
+            pa.BufferReader(data),
+            read_options=pa_csv.ReadOptions(use_threads=True, block_size=BLOCK_SIZE),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=infer_csv_types(data),
+                timestamp_parsers=TIMESTAMP_PARSERS,
+            ),
+        )
+        # Name blank headers (e.g. a saved index) the way pandas.read_csv does
+        table = table.rename_columns([
+            name or f"Unnamed: {i}" for i, name in enumerate(table.column_names)
+        ])
+    df = table.to_pandas(coerce_temporal_nanoseconds=True)
+    # Dictionaries come in order of appearance; sort them so groupby and
+    # sort_index order categoricals the same way as plain strings
+    for col in df.select_dtypes("category").columns:
+        if not df[col].cat.ordered:
+            df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def read_upload(data, required_columns=None):
+    """Parse uploaded bytes (CSV, Parquet or Feather) into a DataFrame.
+
+    Required columns are checked against the header before the body is parsed.
+    """
+    fmt = detect_format(data)
+    if required_columns:
+        header = read_header(data, fmt)
+        missing = [col for col in required_columns if col not in header]
+        if missing:
+            raise MissingColumnsError(missing)
+    with span("parse_upload", format=fmt, bytes=len(data)) as traced_span:
+        df = read_table(data, fmt)
+        traced_span.tag(rows=len(df))
+    return df
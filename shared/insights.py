@@ -0,0 +1,102 @@
+import os
+
+import joblib
+import pandas as pd
+
+from shared.cache import CACHE_DIR, LRUCache, content_hash, dataset_hash, prune_cache_dir, touch
+from shared.demand import build_demand_index
+from shared.rfm import build_rfm, build_rfm_history, prepare_transactions
+from shared.tracing import span
+
+# The RFM table and the segment/product demand index of a dataset, in memory
+# and as joblib files under CACHE_DIR; the image build writes the bundled
+# dataset's (see precompute.py), uploads are computed on first use
+INSIGHTS_CACHE_MAX_ENTRIES = 8
+# Bump when build_rfm, build_rfm_history or build_demand_index change so stale
+# files are not loaded
+INSIGHTS_FORMAT_VERSION = 3
+RFM_FIELDS = ('InvoiceDate', 'InvoiceNo', 'CustomerID', 'Revenue')
+# Month-end snapshots the segment transitions cover
+HISTORY_MONTHS = 24
+
+_insights = LRUCache(INSIGHTS_CACHE_MAX_ENTRIES)
+_histories = LRUCache(INSIGHTS_CACHE_MAX_ENTRIES)
+
+
+def insights_path(key):
+    return os.path.join(CACHE_DIR, f"rfm-{key}-v{INSIGHTS_FORMAT_VERSION}.joblib")
+
+
+def history_path(key, snapshots_key):
+    return os.path.join(CACHE_DIR, f"rfm-history-{key}-{snapshots_key}-v{INSIGHTS_FORMAT_VERSION}.joblib")
+
+
+def _save(path, tables):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(tables, tmp)
+    os.replace(tmp, path)
+    prune_cache_dir(keep=path)
+
+
+def _load(path):
+    """Tables saved at ``path``, or None."""
+    if not os.path.exists(path):
+        return None
+    touch(path)
+    return joblib.load(path)
+
+
+def build_insights(df, key):
+    """Prepared transactions, RFM table, transactions with segments and demand index.
+
+    The RFM table and demand index are read from disk when saved under ``key``
+    and saved otherwise; preparing the rows and merging the segments back is
+    repeated, as it is linear and cheap next to them.
+    """
+    path = insights_path(key)
+    tables = _load(path)
+    df = prepare_transactions(df)
+    rfm = tables['rfm'] if tables is not None else build_rfm(df, *RFM_FIELDS)
+    # Merge RFM table (with CustomerID, Segment) back to the main DataFrame
+    with span("merge_segments", df):
+        df_merged = df.merge(rfm[['Segment']], on='CustomerID')
+    if tables is None:
+        tables = {'rfm': rfm, 'demand_index': build_demand_index(df_merged)}
+        _save(path, tables)
+    return df, rfm, df_merged, tables['demand_index']
+
+
+def get_insights(df):
+    """``build_insights`` of ``df``, built once per dataset and shared by all sessions."""
+    key = dataset_hash(df)
+    insights = _insights.get(key)
+    if insights is None:
+        insights = _insights.put(key, build_insights(df, key))
+    return insights
+
+
+def month_end_snapshots(dates, months=HISTORY_MONTHS):
+    """The last ``months`` month ends up to the latest of ``dates``, each covering its whole last day."""
+    month_ends = pd.date_range(dates.min().normalize(), dates.max(), freq='ME')[-months:]
+    return month_ends + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+
+
+def get_rfm_history(df, snapshots):
+    """``build_rfm_history`` of ``df`` at ``snapshots``, built once per dataset and snapshot set.
+
+    ``df`` is the frame passed to ``get_insights``; the history is kept in
+    memory and under CACHE_DIR like the RFM table.
+    """
+    key = dataset_hash(df)
+    snapshots = pd.DatetimeIndex(snapshots)
+    snapshots_key = content_hash(snapshots.asi8.tobytes())
+    history = _histories.get((key, snapshots_key))
+    if history is None:
+        path = history_path(key, snapshots_key)
+        history = _load(path)
+        if history is None:
+            history = build_rfm_history(get_insights(df)[0], snapshots, *RFM_FIELDS)
+            _save(path, history)
+        history = _histories.put((key, snapshots_key), history)
+    return history
@@ -0,0 +1,274 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from shared import tracing
+
+# Training runs in a pool of worker processes shared by every session of the
+# server, so sessions queue for the CPU instead of each taking a core inline
+JOB_WORKERS = int(os.getenv("HOLITICA_JOB_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Threads each job may use, so the workers together do not oversubscribe the cores
+JOB_THREADS = max(1, (os.cpu_count() or 1) // JOB_WORKERS)
+# Read by the OpenMP and BLAS runtimes when they load, so they are set in the
+# environment the workers are spawned with
+THREAD_ENV = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
+# Jobs queued or running at once (all sessions), and per session
+JOB_QUEUE_MAX = int(os.getenv("HOLITICA_JOB_QUEUE_MAX", "16"))
+JOB_MAX_PER_OWNER = 2
+# Finished jobs remembered for sessions that have not polled them yet; a
+# failed job keeps failing for every session until one retries it
+JOB_KEEP_FINISHED = 64
+JOB_POLL_SECONDS = 1.0
+# Shown for the jobs of a worker process that died, e.g. out of memory
+WORKER_DIED_MESSAGE = "A worker process stopped unexpectedly, possibly out of memory. Please try again."
+
+_pool = None
+_manager = None
+_progress = None
+_jobs = {}
+_finished = []
+_lock = threading.Lock()
+
+# Set in worker processes: where report_progress writes
+_worker_progress = None
+_worker_job = None
+
+
+class QueueFullError(RuntimeError):
+    def __init__(self, message="The server is busy training other models. Please try again in a minute."):
+        super().__init__(message)
+
+
+def _init_worker(progress):
+    global _worker_progress
+    _worker_progress = progress
+
+
+def _run(job_id, fn, args):
+    global _worker_job
+    _worker_job = job_id
+    # Spans inside the job are tagged page "job"; the worker appends them to a JSONL sink itself
+    tracing.start_page("job")
+    report_progress(0.0, "Started")
+    try:
+        return fn(*args)
+    finally:
+        _worker_job = None
+
+
+def report_progress(fraction, message=""):
+    """Publish the progress of the running job; does nothing outside a job."""
+    if _worker_progress is not None and _worker_job is not None:
+        _worker_progress[_worker_job] = (fraction, message)
+
+
+@contextmanager
+def _spawning():
+    # Streamlit runs each page as __main__, and spawned processes re-run the
+    # parent's __main__ file: hide it while they start so they do not run the page.
+    # The workers import numpy while starting, so the thread limits must already
+    # be in the environment they inherit; the server's own are restored after
+    main = sys.modules['__main__']
+    saved = {name: os.environ.get(name) for name in THREAD_ENV}
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    os.environ.update({name: str(JOB_THREADS) for name in THREAD_ENV})
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _get_pool():
+    global _pool, _manager, _progress
+    # spawn, not fork: the server process has threads, and workers must start clean
+    context = multiprocessing.get_context("spawn")
+    if _manager is None:
+        with _spawning():
+            _manager = context.Manager()
+        _progress = _manager.dict()
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=JOB_WORKERS, mp_context=context,
+            initializer=_init_worker, initargs=(_progress,),
+        )
+    return _pool
+
+
+def _drop_pool(pool):
+    """Shut down a broken pool so the next submit starts a fresh one; call with ``_lock`` held."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    # Its queued and running jobs have already failed with BrokenProcessPool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _finish(job_id, on_done, future):
+    with _lock:
+        job = _jobs.get(job_id)
+    if tracing.TRACE and job is not None:
+        # Queueing included: the time from submit until the result is back
+        tracing.record_span({
+            "stage": f"job:{job['name']}", "page": "jobs", "job": str(job_id),
+            "seconds": time.time() - job['submitted'], "ended": time.time(),
+        })
+    error = future.exception()
+    result = None
+    if error is None:
+        try:
+            if on_done is None:
+                result = future.result()
+            else:
+                # The result lives on in the cache on_done puts it in, not here
+                on_done(future.result())
+        except Exception as e:
+            error = e
+    with _lock:
+        if isinstance(error, BrokenProcessPool) and job is not None:
+            _drop_pool(job['pool'])
+        if job is not None and _jobs.get(job_id) is job:
+            # The future (and with it the result) is dropped: only the outcome is kept
+            job.pop('future', None)
+            job.update(state='failed' if error is not None else 'done', error=error, result=result,
+                       handed_off=error is None and on_done is not None)
+        _finished.append(job_id)
+        while len(_finished) > JOB_KEEP_FINISHED:
+            _jobs.pop(_finished.pop(0), None)
+    if _progress is not None:
+        _progress.pop(job_id, None)
+
+
+def submit(job_id, fn, *args, owner=None, on_done=None, retry=False):
+    """Run ``fn(*args)`` in the worker pool under ``job_id`` and return the id.
+
+    A job with the same id that is queued, running or finished is reused
+    instead of started again, so identical requests share one run. A failed
+    job keeps its error until a caller passes ``retry=True``; a job whose
+    result went to ``on_done`` runs again, as the caller no longer found it.
+    ``on_done(result)`` runs in this process when the job succeeds, e.g. to
+    put the result in a cache. Raises ``QueueFullError`` when too many jobs
+    are pending overall or for ``owner``.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            if job.get('state') is None:
+                return job_id
+            if job['state'] == 'failed' and not retry:
+                return job_id
+            if job['state'] == 'done' and not job['handed_off']:
+                return job_id
+        pending = [job for job in _jobs.values() if job.get('state') is None]
+        if len(pending) >= JOB_QUEUE_MAX:
+            raise QueueFullError()
+        if owner is not None and sum(job['owner'] == owner for job in pending) >= JOB_MAX_PER_OWNER:
+            raise QueueFullError("Please wait for your running analyses to finish first.")
+        # Workers are started on demand, by submit; a pool broken by a dead
+        # worker is replaced once
+        for attempt in range(2):
+            pool = _get_pool()
+            try:
+                with _spawning():
+                    future = pool.submit(_run, job_id, fn, args)
+                break
+            except BrokenProcessPool:
+                _drop_pool(pool)
+                if attempt:
+                    raise
+        job = {'future': future, 'pool': pool, 'owner': owner, 'submitted': time.time(), 'name': fn.__name__}
+        _jobs[job_id] = job
+    future.add_done_callback(lambda done: _finish(job_id, on_done, done))
+    return job_id
+
+
+def _message(error):
+    if isinstance(error, BrokenProcessPool):
+        return WORKER_DIED_MESSAGE
+    return str(error)
+
+
+def job_status(job_id):
+    """State ('queued', 'running', 'done', 'failed' or 'unknown'), progress and message of a job.
+
+    A job is 'done' once its ``on_done`` has run, so its result is in the cache.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return {'state': 'unknown', 'progress': 0.0, 'message': ''}
+        state = job.get('state')
+        if state == 'failed':
+            return {'state': 'failed', 'progress': 1.0, 'message': _message(job['error'])}
+        if state == 'done':
+            return {'state': 'done', 'progress': 1.0, 'message': ''}
+        ahead = sum(
+            1 for other in _jobs.values()
+            if other.get('state') is None and other['submitted'] < job['submitted']
+        )
+    if job['future'].done():
+        return {'state': 'running', 'progress': 1.0, 'message': "Finishing"}
+    fraction, message = _progress.get(job_id, (None, None)) if _progress is not None else (None, None)
+    if fraction is None:
+        waiting = max(0, ahead - JOB_WORKERS + 1)
+        message = f"Waiting for {waiting} job(s) ahead" if waiting else "Starting"
+        return {'state': 'queued', 'progress': 0.0, 'message': message}
+    return {'state': 'running', 'progress': fraction, 'message': message}
+
+
+def job_result(job_id):
+    """Result of a finished job (re-raising its error), or None while it is pending.
+
+    Also None for jobs submitted with ``on_done``: their result is only kept
+    where ``on_done`` put it.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None or job.get('state') is None:
+        return None
+    if job['error'] is not None:
+        raise job['error']
+    return job['result']
+
+
+def session_owner():
+    """Id of the current Streamlit session, for the per-session job limit."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def show_job_progress(job_id, label):
+    """Progress bar that polls the job and reruns the page once it has finished."""
+    @st.fragment(run_every=JOB_POLL_SECONDS)
+    def poll():
+        status = job_status(job_id)
+        if status['state'] in ('done', 'failed', 'unknown'):
+            st.rerun(scope="app")
+        st.progress(status['progress'], text=f"{label} {status['message']}".strip())
+
+    poll()
+
+
+def show_job_failure(job_id, message, retry):
+    """Error of a failed job, with a button that calls ``retry()`` and reruns the page."""
+    st.error(message)
+    if st.button("Try again", key=f"retry-{job_id}"):
+        try:
+            retry()
+        except QueueFullError as e:
+            st.warning(str(e))
+        else:
+            st.rerun()
@@ -0,0 +1,333 @@
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+from shared.cache import CACHE_DIR, LRUCache, content_hash, dataset_hash, prune_cache_dir, touch
+from shared.jobs import report_progress, submit
+from shared.tracing import span
+
+# Recommendations shown per user
+TOP_N = 5
+# Users scored per matrix product when precomputing every user's list
+SCORE_BATCH_USERS = 4096
+
+# Trained models are kept in memory and spilled to CACHE_DIR, keyed by dataset
+# and hyperparameters, so reruns and restarts load them instead of training again
+MODEL_CACHE_MAX_ENTRIES = 8
+MODEL_CACHE_MAX_MB = 256
+# Bump when the saved arrays change so stale files are not loaded
+MODEL_FORMAT_VERSION = 2
+# SVD attributes that change the trained model
+SVD_HYPERPARAMETERS = [
+    'n_factors', 'n_epochs', 'biased', 'init_mean', 'init_std_dev',
+    'lr_bu', 'lr_bi', 'lr_pu', 'lr_qi', 'reg_bu', 'reg_bi', 'reg_pu', 'reg_qi', 'random_state',
+]
+# Surprise's SVD() defaults, spelled out so the page's model key is known
+# without importing Surprise
+SVD_DEFAULTS = {
+    'n_factors': 100, 'n_epochs': 20, 'biased': True, 'init_mean': 0, 'init_std_dev': 0.1,
+    'lr_bu': 0.005, 'lr_bi': 0.005, 'lr_pu': 0.005, 'lr_qi': 0.005,
+    'reg_bu': 0.02, 'reg_bi': 0.02, 'reg_pu': 0.02, 'reg_qi': 0.02, 'random_state': None,
+}
+_ARRAYS = ['pu', 'qi', 'bu', 'bi', 'raw_uids', 'raw_iids']
+
+
+def model_nbytes(model):
+    ratings = model['ratings']
+    return sum(model[name].nbytes for name in ['pu', 'qi', 'bu', 'bi']) \
+        + ratings.data.nbytes + ratings.indices.nbytes + ratings.indptr.nbytes
+
+
+_models = LRUCache(MODEL_CACHE_MAX_ENTRIES, MODEL_CACHE_MAX_MB * 1024 * 1024, sizeof=model_nbytes)
+_top_lists = LRUCache(MODEL_CACHE_MAX_ENTRIES)
+
+
+def ratings_matrix(rows, cols, values, shape):
+    """Sparse users x items rating matrix (inner ids); a repeated pair keeps its last rating."""
+    rows, cols, values = np.asarray(rows), np.asarray(cols), np.asarray(values, dtype=float)
+    pairs = rows.astype(np.int64) * shape[1] + cols
+    # Reverse so np.unique's first occurrence is the last rating given
+    _, last = np.unique(pairs[::-1], return_index=True)
+    keep = len(pairs) - 1 - last
+    return sparse.csr_matrix((values[keep], (rows[keep], cols[keep])), shape=shape)
+
+
+def trainset_ratings(trainset):
+    """The ratings of a Surprise trainset as a sparse users x items matrix."""
+    rows, cols, values = (np.array(column) for column in zip(*trainset.all_ratings())) \
+        if trainset.n_ratings else ([], [], [])
+    return ratings_matrix(rows, cols, values, (trainset.n_users, trainset.n_items))
+
+
+def svd_params(algo=None):
+    """Hyperparameters of a Surprise SVD, or ``SVD_DEFAULTS`` without one."""
+    if algo is None:
+        return dict(SVD_DEFAULTS)
+    return {name: getattr(algo, name) for name in SVD_HYPERPARAMETERS}
+
+
+def index_model(model):
+    """Add the raw -> inner user id lookup (not saved; rebuilt on load)."""
+    model['inner_uid'] = {raw: u for u, raw in enumerate(model['raw_uids'].tolist())}
+    return model
+
+
+def svd_factors(algo):
+    """The parts of a fitted Surprise SVD needed to score without ``algo.predict``."""
+    trainset = algo.trainset
+    return index_model({
+        'pu': algo.pu,
+        'qi': algo.qi,
+        'bu': algo.bu,
+        'bi': algo.bi,
+        'biased': algo.biased,
+        'global_mean': trainset.global_mean,
+        'rating_scale': trainset.rating_scale,
+        'raw_uids': np.array([trainset.to_raw_uid(u) for u in range(trainset.n_users)]),
+        'raw_iids': np.array([trainset.to_raw_iid(i) for i in range(trainset.n_items)]),
+        'ratings': trainset_ratings(trainset),
+        'params': svd_params(algo),
+        # Ratings folded in by updates since the last full fit
+        'incremental_ratings': 0,
+    })
+
+
+def model_key(df, algo=None):
+    """Cache key of an SVD trained on ``df`` with ``algo``'s hyperparameters (default: ``SVD_DEFAULTS``)."""
+    key = [dataset_hash(df), svd_params(algo), MODEL_FORMAT_VERSION]
+    return content_hash(json.dumps(key, sort_keys=True).encode())
+
+
+def _model_path(key):
+    return os.path.join(CACHE_DIR, f"svd-{key}.npz")
+
+
+def save_model(key, model):
+    """Write the model's arrays to ``CACHE_DIR`` as an uncompressed ``.npz``.
+
+    Models whose ids are not plain numbers or strings stay in memory only.
+    """
+    if model['raw_uids'].dtype == object or model['raw_iids'].dtype == object:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _model_path(key)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp,
+        pu=model['pu'], qi=model['qi'], bu=model['bu'], bi=model['bi'],
+        raw_uids=model['raw_uids'], raw_iids=model['raw_iids'],
+        ratings_data=model['ratings'].data, ratings_indices=model['ratings'].indices,
+        ratings_indptr=model['ratings'].indptr,
+        params=np.array(json.dumps(model['params'])),
+        scalars=np.array(
+            [model['global_mean'], *model['rating_scale'], model['biased'], model['incremental_ratings']],
+            dtype=float,
+        ),
+    )
+    os.replace(tmp, path)
+    prune_cache_dir(keep=path)
+
+
+def load_model(key):
+    """Model saved under ``key``, or None if there is none."""
+    path = _model_path(key)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as saved:
+        arrays = {name: saved[name] for name in _ARRAYS}
+        ratings = (saved['ratings_data'], saved['ratings_indices'], saved['ratings_indptr'])
+        params = json.loads(saved['params'].item())
+        global_mean, lower, upper, biased, incremental_ratings = saved['scalars'].tolist()
+    touch(path)
+    shape = (len(arrays['raw_uids']), len(arrays['raw_iids']))
+    return index_model({
+        **arrays,
+        'biased': bool(biased),
+        'global_mean': global_mean,
+        'rating_scale': (lower, upper),
+        'ratings': sparse.csr_matrix(ratings, shape=shape),
+        'params': params,
+        'incremental_ratings': int(incremental_ratings),
+    })
+
+
+def get_model(df, train_set, algo):
+    """Fitted factors of ``algo`` on ``train_set``, from memory, disk, or by training.
+
+    ``df`` is only hashed: the key is the dataset and the hyperparameters, so a
+    rerun or restart with the same data loads the model instead of fitting it.
+    """
+    key = model_key(df, algo)
+    model = cached_model(key)
+    if model is None:
+        algo.fit(train_set)
+        model = cache_model(key, svd_factors(algo))
+    return model
+
+
+def cached_model(key):
+    """Model stored under ``key`` in memory or on disk, or None."""
+    model = _models.get(key)
+    if model is None:
+        model = load_model(key)
+        if model is not None:
+            _models.put(key, model)
+    return model
+
+
+def cache_model(key, model):
+    save_model(key, model)
+    return _models.put(key, model)
+
+
+def train_svd_model(ratings, rating_scale, params):
+    """Fit ``SVD(**params)`` on a user, item, rating DataFrame and return its factors."""
+    # Imported here: the page only needs Surprise in the worker that trains
+    from surprise import Dataset, Reader, SVD
+
+    report_progress(0.1, "Preparing ratings")
+    train_set = Dataset.load_from_df(ratings, Reader(rating_scale=rating_scale)).build_full_trainset()
+    report_progress(0.3, "Training model")
+    algo = SVD(**params)
+    with span("svd_fit", ratings):
+        algo.fit(train_set)
+    return svd_factors(algo)
+
+
+def training_args(df, algo=None, user_field='User ID', item_field='Product ID', rating_field='Rating'):
+    """Arguments of ``train_svd_model`` that train ``algo`` on ``df``."""
+    rating_scale = (df[rating_field].min(), df[rating_field].max())
+    return df[[user_field, item_field, rating_field]], rating_scale, svd_params(algo)
+
+
+def start_model(df, algo=None, owner=None, user_field='User ID', item_field='Product ID', rating_field='Rating',
+                retry=False):
+    """Train ``algo`` on ``df`` in the job pool unless it is cached; returns the job id (the model key).
+
+    When the job finishes the model is cached, so ``cached_model`` returns it.
+    A failed job is only run again with ``retry``.
+    """
+    key = model_key(df, algo)
+    if cached_model(key) is None:
+        submit(key, train_svd_model, *training_args(df, algo, user_field, item_field, rating_field),
+               owner=owner, on_done=lambda model: cache_model(key, model), retry=retry)
+    return key
+
+
+def score_users(model, inner_uids):
+    """Estimated ratings of every item for the given users, as ``algo.predict`` computes them.
+
+    The terms are added in the same order as ``SVD.estimate`` and clipped to the
+    rating scale, so the scores match the per-item path.
+    """
+    inner_uids = np.asarray(inner_uids)
+    dots = model['pu'][inner_uids] @ model['qi'].T
+    if model['biased']:
+        user_part = model['global_mean'] + model['bu'][inner_uids]
+        dots = (user_part[:, None] + model['bi'][None, :]) + dots
+    lower, upper = model['rating_scale']
+    return np.clip(dots, lower, upper)
+
+
+def top_n_indices(scores, n=TOP_N):
+    """Indices of the ``n`` highest scores, best first.
+
+    Ties keep the lower index first, like a stable sort over items in inner id
+    order. Masked (-inf) entries are never returned.
+    """
+    valid = np.flatnonzero(scores > -np.inf)
+    if len(valid) <= n:
+        candidates = valid
+    else:
+        kth = np.partition(scores[valid], len(valid) - n)[len(valid) - n]
+        above = valid[scores[valid] > kth]
+        ties = valid[scores[valid] == kth][:n - len(above)]
+        candidates = np.concatenate([above, ties])
+    candidates.sort()
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def _mask_seen(scores, ratings, inner_uids):
+    block = ratings[inner_uids]
+    rows = np.repeat(np.arange(len(inner_uids)), np.diff(block.indptr))
+    scores[rows, block.indices] = -np.inf
+    return scores
+
+
+def top_n_lists(model, n=TOP_N, batch_users=SCORE_BATCH_USERS):
+    """Top ``n`` unseen items of every user as arrays indexed by inner user id.
+
+    ``items`` holds inner item ids, best first, and ``estimates`` their
+    scores; users with fewer than ``n`` unseen items are padded with -1 (and
+    NaN). Users are scored in blocks of ``batch_users`` so the score matrix
+    stays bounded; each block is one matrix product.
+    """
+    n_users = len(model['raw_uids'])
+    items = np.full((n_users, n), -1, dtype=np.int64)
+    estimates = np.full((n_users, n), np.nan)
+    for start in range(0, n_users, batch_users):
+        inner_uids = np.arange(start, min(start + batch_users, n_users))
+        scores = _mask_seen(score_users(model, inner_uids), model['ratings'], inner_uids)
+        for row, u in enumerate(inner_uids):
+            top = top_n_indices(scores[row], n)
+            items[u, :len(top)] = top
+            estimates[u, :len(top)] = scores[row, top]
+    return {'items': items, 'estimates': estimates}
+
+
+def _listed(model, lists, u, n):
+    top, estimates = lists['items'][u, :n], lists['estimates'][u, :n]
+    found = top >= 0
+    return list(zip(model['raw_iids'][top[found]], estimates[found]))
+
+
+def _top_n_path(key, n):
+    return os.path.join(CACHE_DIR, f"top-{key}-{n}.npz")
+
+
+def save_top_n(key, lists):
+    """Keep ``top_n_lists`` of the model under ``key`` in memory and on disk."""
+    n = lists['items'].shape[1]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _top_n_path(key, n)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **lists)
+    os.replace(tmp, path)
+    prune_cache_dir(keep=path)
+    return _top_lists.put((key, n), lists)
+
+
+def cached_top_n(key, n=TOP_N):
+    """Saved ``top_n_lists`` of the model under ``key``, or None.
+
+    Only models precomputed ahead of time (see precompute.py) have them;
+    uploads are scored one user at a time.
+    """
+    lists = _top_lists.get((key, n))
+    if lists is None and os.path.exists(_top_n_path(key, n)):
+        with np.load(_top_n_path(key, n), allow_pickle=False) as saved:
+            lists = _top_lists.put((key, n), {name: saved[name] for name in ['items', 'estimates']})
+        touch(_top_n_path(key, n))
+    return lists
+
+
+def recommend(model, raw_uid, n=TOP_N, lists=None):
+    """Top ``n`` unseen items for one user as a list of (raw item id, estimate).
+
+    With ``lists`` (``top_n_lists`` of the same model, at least ``n`` long)
+    the user's row is read instead of scoring every item.
+    """
+    u = model['inner_uid'][raw_uid]
+    if lists is not None and lists['items'].shape[1] >= n:
+        return _listed(model, lists, u, n)
+    scores = _mask_seen(score_users(model, [u]), model['ratings'], [u])[0]
+    top = top_n_indices(scores, n)
+    return list(zip(model['raw_iids'][top], scores[top]))
+
+
+def recommend_all(model, n=TOP_N, batch_users=SCORE_BATCH_USERS):
+    """Top ``n`` unseen items for every user, keyed by raw user id."""
+    lists = top_n_lists(model, n, batch_users)
+    return {raw_uid: _listed(model, lists, u, n) for u, raw_uid in enumerate(model['raw_uids'])}
@@ -0,0 +1,228 @@
+import time
+
+import numpy as np
+import pandas as pd
+from surprise import Dataset, Reader, SVD
+
+from shared.recommend import cache_model, cached_model, index_model, ratings_matrix, svd_factors
+
+# SGD passes over the affected ratings when folding in new ones
+INCREMENTAL_EPOCHS = 5
+# refresh_model retrains in full once this share of the ratings came in incrementally
+RETRAIN_MAX_SHARE = 0.2
+# Held-out share for the drift check, and how much worse (relative RMSE) the
+# incremental model may be before a full retrain is recommended
+HOLDOUT_SHARE = 0.2
+DRIFT_TOLERANCE = 0.02
+
+
+def _extend_ids(raw_ids, new_raw_ids):
+    """Inner ids of ``new_raw_ids``, appending the ones not seen before.
+
+    The ids keep a type that holds old and new ones alike (e.g. the longer of
+    two string widths); numbers mixed with strings become an object array.
+    """
+    known = pd.Index(raw_ids)
+    unseen = np.array(pd.unique(new_raw_ids[~pd.Index(new_raw_ids).isin(known)]).tolist())
+    if not len(unseen):
+        extended = raw_ids
+    elif not len(raw_ids):
+        extended = unseen
+    else:
+        strings = (raw_ids.dtype.kind == 'U', unseen.dtype.kind == 'U')
+        dtype = np.result_type(raw_ids, unseen) if strings[0] == strings[1] else object
+        extended = np.concatenate([raw_ids.astype(dtype), unseen.astype(dtype)])
+    return extended, pd.Index(extended).get_indexer(new_raw_ids), len(unseen)
+
+
+def _sgd(model, rows, cols, values, update_user, update_item, n_epochs, rng):
+    """Surprise's SVD updates, restricted to the flagged users and items.
+
+    Each epoch visits the ratings in a random order, in mini-batches holding at
+    most one rating per user, so a batch is one vectorized step. Item updates
+    from the same batch are summed.
+    """
+    params = model['params']
+    pu, qi, bu, bi = model['pu'], model['qi'], model['bu'], model['bi']
+    global_mean = model['global_mean'] if model['biased'] else 0
+    for _ in range(n_epochs):
+        order = rng.permutation(len(values))
+        # k-th rating of each user (in this epoch's order) goes to batch k
+        batch = pd.Series(rows[order]).groupby(rows[order]).cumcount().to_numpy()
+        order = order[np.argsort(batch, kind='stable')]
+        bounds = np.searchsorted(np.sort(batch), np.arange(batch.max(initial=-1) + 2))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            u, i, r = rows[order[start:end]], cols[order[start:end]], values[order[start:end]]
+            err = r - (global_mean + bu[u] + bi[i] + np.einsum('ij,ij->i', qi[i], pu[u]))
+            user_step, item_step = update_user[u], update_item[i]
+            if model['biased']:
+                bu[u] += user_step * params['lr_bu'] * (err - params['reg_bu'] * bu[u])
+                np.add.at(bi, i, item_step * params['lr_bi'] * (err - params['reg_bi'] * bi[i]))
+            puf, qif = pu[u], qi[i]
+            pu[u] += user_step[:, None] * params['lr_pu'] * (err[:, None] * qif - params['reg_pu'] * puf)
+            np.add.at(qi, i, item_step[:, None] * params['lr_qi'] * (err[:, None] * puf - params['reg_qi'] * qif))
+
+
+def update_model(model, new_ratings, user_field='User ID', item_field='Product ID', rating_field='Rating',
+                 n_epochs=INCREMENTAL_EPOCHS, seed=0):
+    """Fold new ratings into a trained model without a full fit.
+
+    New users and items get fresh factors, drawn like ``SVD.fit`` draws them.
+    Then a few SGD epochs run over every rating of the users in ``new_ratings``,
+    updating only the rows of those users and of the rated items (factors and
+    biases); everyone else keeps their trained values. Older ratings of an item
+    by other users are not revisited, so the cost follows the size of the
+    update rather than the popularity of the items. The global mean stays the
+    one of the last full fit. Returns a new model; ``model`` is left as it was.
+    """
+    params = model['params']
+    rng = np.random.default_rng(seed)
+    raw_uids, users, new_users = _extend_ids(model['raw_uids'], new_ratings[user_field].to_numpy())
+    raw_iids, items, new_items = _extend_ids(model['raw_iids'], new_ratings[item_field].to_numpy())
+    n_factors = model['pu'].shape[1]
+
+    def grow(factors, biases, n_new):
+        new_factors = rng.normal(params['init_mean'], params['init_std_dev'], size=(n_new, n_factors))
+        return np.vstack([factors, new_factors]), np.concatenate([biases, np.zeros(n_new)])
+
+    pu, bu = grow(model['pu'], model['bu'], new_users)
+    qi, bi = grow(model['qi'], model['bi'], new_items)
+
+    old = model['ratings'].tocoo()
+    values = new_ratings[rating_field].to_numpy(dtype=float)
+    ratings = ratings_matrix(
+        np.concatenate([old.row, users]), np.concatenate([old.col, items]),
+        np.concatenate([old.data, values]), (len(raw_uids), len(raw_iids)),
+    )
+    lower, upper = model['rating_scale']
+    updated = index_model({
+        **model,
+        'pu': pu, 'qi': qi, 'bu': bu, 'bi': bi,
+        'raw_uids': raw_uids, 'raw_iids': raw_iids,
+        'ratings': ratings,
+        'rating_scale': (min(lower, values.min(initial=lower)), max(upper, values.max(initial=upper))),
+        'incremental_ratings': model['incremental_ratings'] + len(new_ratings),
+    })
+
+    update_user = np.zeros(len(raw_uids), dtype=bool)
+    update_user[users] = True
+    update_item = np.zeros(len(raw_iids), dtype=bool)
+    update_item[items] = True
+    affected_users = np.flatnonzero(update_user)
+    affected = ratings[affected_users].tocoo()
+    _sgd(updated, affected_users[affected.row], affected.col, affected.data,
+         update_user, update_item, n_epochs, rng)
+    return updated
+
+
+def model_ratings(model, user_field='User ID', item_field='Product ID', rating_field='Rating'):
+    """All ratings a model has seen, as a DataFrame with raw ids."""
+    ratings = model['ratings'].tocoo()
+    return pd.DataFrame({
+        user_field: model['raw_uids'][ratings.row],
+        item_field: model['raw_iids'][ratings.col],
+        rating_field: ratings.data,
+    })
+
+
+def retrain_model(model):
+    """Full ``SVD.fit`` on every rating the model holds, with the same hyperparameters."""
+    df = model_ratings(model)
+    train_set = Dataset.load_from_df(df, Reader(rating_scale=model['rating_scale'])).build_full_trainset()
+    algo = SVD(**model['params'])
+    algo.fit(train_set)
+    return svd_factors(algo)
+
+
+def refresh_model(model, new_ratings, retrain_share=RETRAIN_MAX_SHARE, **fields):
+    """Incremental update, falling back to a full retrain once enough ratings came in incrementally."""
+    updated = update_model(model, new_ratings, **fields)
+    if updated['incremental_ratings'] > retrain_share * updated['ratings'].nnz:
+        return retrain_model(updated)
+    return updated
+
+
+def update_saved_model(key, new_key, new_ratings, retrain_share=RETRAIN_MAX_SHARE, **fields):
+    """Refresh the model cached under ``key`` and cache the result under ``new_key``.
+
+    ``new_key`` is the ``model_key`` of the dataset with the new ratings added,
+    so the page finds the updated model instead of training on that dataset.
+    """
+    model = cached_model(key)
+    if model is None:
+        raise KeyError(f"No saved model under {key}")
+    return cache_model(new_key, refresh_model(model, new_ratings, retrain_share, **fields))
+
+
+def predict_ratings(model, raw_uids, raw_iids):
+    """Estimates for (user, item) pairs, as ``algo.predict`` makes them.
+
+    Unknown users or items contribute no bias and no factor term, like
+    ``SVD.estimate``; unbiased models predict the global mean for those pairs
+    where Surprise would report the prediction as impossible.
+    """
+    users = pd.Index(model['raw_uids']).get_indexer(raw_uids)
+    items = pd.Index(model['raw_iids']).get_indexer(raw_iids)
+    known_user, known_item = users >= 0, items >= 0
+    both = known_user & known_item
+    est = np.zeros(len(users))
+    est[both] = np.einsum('ij,ij->i', model['qi'][items[both]], model['pu'][users[both]])
+    if model['biased']:
+        est += model['global_mean']
+        est[known_user] += model['bu'][users[known_user]]
+        est[known_item] += model['bi'][items[known_item]]
+    else:
+        est[~both] = model['global_mean']
+    lower, upper = model['rating_scale']
+    return np.clip(est, lower, upper)
+
+
+def rmse(model, ratings, user_field='User ID', item_field='Product ID', rating_field='Rating'):
+    est = predict_ratings(model, ratings[user_field].to_numpy(), ratings[item_field].to_numpy())
+    return float(np.sqrt(np.mean((ratings[rating_field].to_numpy(dtype=float) - est) ** 2)))
+
+
+def drift_check(ratings, new_ratings, holdout_share=HOLDOUT_SHARE, tolerance=DRIFT_TOLERANCE,
+                params=None, seed=0, user_field='User ID', item_field='Product ID', rating_field='Rating'):
+    """Compare an incremental update against a full retrain on held-out ratings.
+
+    ``holdout_share`` of both the existing and the new ratings is held out. A
+    model is fitted on the rest of ``ratings``, then brought up to date twice:
+    with ``update_model`` and with a full fit on all training ratings. RMSE is
+    reported on the whole held-out set and on the held-out new ratings alone.
+    """
+    fields = dict(user_field=user_field, item_field=item_field, rating_field=rating_field)
+    rng = np.random.default_rng(seed)
+    base_test = rng.random(len(ratings)) < holdout_share
+    new_test = rng.random(len(new_ratings)) < holdout_share
+    base_train, new_train = ratings[~base_test], new_ratings[~new_test]
+    test = pd.concat([ratings[base_test], new_ratings[new_test]])
+    columns = [user_field, item_field, rating_field]
+    scale = (min(ratings[rating_field].min(), new_ratings[rating_field].min()),
+             max(ratings[rating_field].max(), new_ratings[rating_field].max()))
+
+    def fit(df):
+        train_set = Dataset.load_from_df(df[columns], Reader(rating_scale=scale)).build_full_trainset()
+        algo = SVD(**{'random_state': seed, **(params or {})})
+        algo.fit(train_set)
+        return svd_factors(algo)
+
+    base = fit(base_train)
+    start = time.perf_counter()
+    incremental = update_model(base, new_train, seed=seed, **fields)
+    incremental_s = time.perf_counter() - start
+    start = time.perf_counter()
+    full = fit(pd.concat([base_train, new_train]))
+    full_s = time.perf_counter() - start
+
+    report = {
+        'incremental_rmse': rmse(incremental, test, **fields),
+        'full_rmse': rmse(full, test, **fields),
+        'incremental_new_rmse': rmse(incremental, new_ratings[new_test], **fields),
+        'full_new_rmse': rmse(full, new_ratings[new_test], **fields),
+        'base_rmse': rmse(base, test, **fields),
+        'incremental_s': incremental_s,
+        'full_s': full_s,
+    }
+    report['retrain_recommended'] = report['incremental_rmse'] > report['full_rmse'] * (1 + tolerance)
+    return report
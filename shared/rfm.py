@@ -1,6 +1,26 @@
 import pandas as pd
+import numpy as np
 import datetime as dt
 
+from shared.tracing import traced
+
+# Segment rules, checked top to bottom: the first rule whose minimum scores are
+# all met wins. Scores run from 1 to 5, so a minimum of 5 means "== 5".
+SEGMENT_RULES = [
+    ('VIP', {'R_Score': 5, 'F_Score': 4}),
+    ('Loyal', {'R_Score': 4, 'F_Score': 4}),
+    ('Recent', {'R_Score': 5}),
+    ('Frequent', {'F_Score': 4}),
+    ('Big Spender', {'M_Score': 4}),
+]
+DEFAULT_SEGMENT = 'Others'
+SCORE_COLUMNS = ['R_Score', 'F_Score', 'M_Score']
+# Rows per chunk when streaming transaction exports
+CHUNK_ROWS = 1_000_000
+# Monetary is rounded before scoring so that sums which are equal up to float
+# summation order (chunked, incremental or in-memory) land in the same quintile.
+MONETARY_DECIMALS = 6
+
 def segment_customer(row):
     if row['R_Score'] >= 5 and row['F_Score'] >= 4:
         return 'VIP'
@@ -15,26 +35,186 @@ def segment_customer(row):
     else:
         return 'Others'
 
-def build_rfm(df, date_field, order_id_field, customer_id_field, monetary_field):
-    snapshot_date = df[date_field].max() + dt.timedelta(days=1)
-    # Group by CustomerID and aggregate
-    rfm = df.groupby(customer_id_field).agg({
-        date_field: lambda x: (snapshot_date - x.max()).days,  # Recency
-        order_id_field: 'nunique',  # Frequency
-        monetary_field: 'sum'  # Monetary
-    })
+def segment_lookup_table(rules=SEGMENT_RULES, default=DEFAULT_SEGMENT):
+    """Resolve the rules once for every (R, F, M) score combination.
+
+    Returns an object array of 125 labels indexed by (R-1)*25 + (F-1)*5 + (M-1).
+    """
+    grid = np.arange(125)
+    scores = {
+        'R_Score': grid // 25 + 1,
+        'F_Score': grid // 5 % 5 + 1,
+        'M_Score': grid % 5 + 1,
+    }
+    conditions = [
+        np.logical_and.reduce([scores[col] >= minimum for col, minimum in thresholds.items()])
+        for _, thresholds in rules
+    ]
+    labels = [label for label, _ in rules]
+    return np.select(conditions, labels, default=default).astype(object)
+
+def _score_codes(rfm):
+    r, f, m = (rfm[col].to_numpy(dtype=np.int64) for col in SCORE_COLUMNS)
+    return (r - 1) * 25 + (f - 1) * 5 + (m - 1)
 
-    # Rename columns for clarity
-    rfm.rename(columns={
-        date_field: 'Recency',
-        order_id_field: 'Frequency',
-        monetary_field: 'Monetary'
-    }, inplace=True)
+def assign_segments(rfm, rules=SEGMENT_RULES, default=DEFAULT_SEGMENT):
+    """Vectorized equivalent of ``rfm.apply(segment_customer, axis=1)``."""
+    table = segment_lookup_table(rules, default)
+    return pd.Series(table[_score_codes(rfm)], index=rfm.index, name='Segment')
 
+# '111' ... '555' in the same layout as segment_lookup_table
+RFM_SCORE_STRINGS = np.array([f'{r}{f}{m}' for r in range(1, 6) for f in range(1, 6) for m in range(1, 6)], dtype=object)
+
+def label_scores(rfm, rules=SEGMENT_RULES):
+    """Add RFM_Score and Segment to a table that has its R/F/M scores."""
+    rfm['RFM_Score'] = RFM_SCORE_STRINGS[_score_codes(rfm)]
+    rfm['Segment'] = assign_segments(rfm, rules)
+    return rfm
+
+def score_rfm(rfm, rules=SEGMENT_RULES):
+    """Add R/F/M scores, RFM_Score and Segment to a Recency/Frequency/Monetary table."""
     # Create R, F, M scores from 1 to 5
     rfm['R_Score'] = pd.qcut(rfm['Recency'], 5, labels=[5, 4, 3, 2, 1]).astype(int)
     rfm['F_Score'] = pd.qcut(rfm['Frequency'].rank(method='first'), 5, labels=[1, 2, 3, 4, 5]).astype(int)
-    rfm['M_Score'] = pd.qcut(rfm['Monetary'], 5, labels=[1, 2, 3, 4, 5]).astype(int)
-    rfm['RFM_Score'] = rfm['R_Score'].astype(str) + rfm['F_Score'].astype(str) + rfm['M_Score'].astype(str)
-    rfm['Segment'] = rfm.apply(segment_customer, axis=1)
-    return rfm
\ No newline at end of file
+    rfm['M_Score'] = pd.qcut(rfm['Monetary'].round(MONETARY_DECIMALS), 5, labels=[1, 2, 3, 4, 5]).astype(int)
+    return label_scores(rfm, rules)
+
+@traced()
+def build_rfm(df, date_field, order_id_field, customer_id_field, monetary_field, rules=SEGMENT_RULES):
+    snapshot_date = df[date_field].max() + dt.timedelta(days=1)
+    # Group by CustomerID and aggregate
+    grouped = df.groupby(customer_id_field)
+    rfm = pd.DataFrame({
+        'Recency': (snapshot_date - grouped[date_field].max()).dt.days,
+        'Frequency': grouped[order_id_field].nunique(),
+        'Monetary': grouped[monetary_field].sum(),
+    })
+    return score_rfm(rfm, rules)
+
+@traced()
+def prepare_transactions(df):
+    """Derive the columns the Retail page expects from raw invoice lines."""
+    df['Revenue'] = df['Quantity'] * df['UnitPrice']
+    if not pd.api.types.is_integer_dtype(df['CustomerID']):
+        df['CustomerID'] = df['CustomerID'].astype(int)
+    # Narrowest integer type that holds the IDs
+    df['CustomerID'] = pd.to_numeric(df['CustomerID'], downcast='integer')
+    # Make sure InvoiceDate is in datetime format
+    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+    return df
+
+def read_transactions_chunked(path, chunksize=CHUNK_ROWS):
+    """Yield prepared transaction chunks from a CSV export too large to load at once."""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        yield prepare_transactions(chunk)
+
+def build_rfm_chunked(chunks, date_field, order_id_field, customer_id_field, monetary_field, rules=SEGMENT_RULES):
+    """Streaming version of ``build_rfm`` for transaction sets larger than RAM.
+
+    Only per-customer state is kept between chunks: the last purchase date, the
+    revenue sum and the distinct (customer, order) pairs. Peak memory therefore
+    follows the number of customers and their orders, not the number of lines.
+    """
+    last_dates = None
+    monetary = None
+    orders = []
+    orders_rows = 0
+    compacted_rows = 0
+    for chunk in chunks:
+        grouped = chunk.groupby(customer_id_field)
+        chunk_last = grouped[date_field].max()
+        chunk_monetary = grouped[monetary_field].sum()
+        if last_dates is None:
+            last_dates, monetary = chunk_last, chunk_monetary
+        else:
+            last_dates = pd.concat([last_dates, chunk_last]).groupby(level=0).max()
+            monetary = monetary.add(chunk_monetary, fill_value=0)
+
+        chunk_orders = chunk[[customer_id_field, order_id_field]].drop_duplicates()
+        orders.append(chunk_orders)
+        orders_rows += len(chunk_orders)
+        # Deduplicate across chunks once the buffer has doubled, so the cost stays amortized
+        if orders_rows > 2 * max(compacted_rows, CHUNK_ROWS):
+            orders = [pd.concat(orders).drop_duplicates()]
+            orders_rows = compacted_rows = len(orders[0])
+
+    if last_dates is None:
+        raise ValueError("No transactions to aggregate")
+    orders = pd.concat(orders).drop_duplicates()
+    snapshot_date = last_dates.max() + dt.timedelta(days=1)
+    rfm = pd.DataFrame({
+        'Recency': (snapshot_date - last_dates).dt.days,
+        'Frequency': orders.groupby(customer_id_field).size(),
+        'Monetary': monetary,
+    })
+    rfm.index.name = customer_id_field
+    return score_rfm(rfm, rules)
+
+@traced()
+def build_rfm_history(df, snapshot_dates, date_field, order_id_field, customer_id_field, monetary_field, rules=SEGMENT_RULES):
+    """RFM tables as of several snapshot dates, computed in one pass.
+
+    For each date the result equals ``build_rfm`` on the transactions dated on or
+    before it. Transactions are sorted by date once, assigned to the first
+    snapshot that includes them, aggregated per (customer, snapshot) and carried
+    forward with cumulative sums, so the transactions are not rescanned for
+    every snapshot.
+    Returns a frame indexed by (Snapshot, customer); snapshots with no
+    transactions yet are left out.
+    """
+    snapshot_dates = pd.DatetimeIndex(snapshot_dates).sort_values().unique()
+    buckets = np.searchsorted(snapshot_dates.values, df[date_field].to_numpy(), side='left')
+    included = buckets < len(snapshot_dates)
+    tx = df.loc[included, [customer_id_field, order_id_field, date_field, monetary_field]]
+    tx = tx.assign(_snapshot=buckets[included]).sort_values(date_field, kind='stable')
+    # In date order, an order counts from the snapshot of its first line
+    tx['_new_order'] = ~tx.duplicated([customer_id_field, order_id_field])
+
+    grouped = tx.groupby([customer_id_field, '_snapshot'])
+    per_snapshot = pd.DataFrame({
+        'last_date': grouped[date_field].max(),
+        'orders': grouped['_new_order'].sum(),
+        'monetary': grouped[monetary_field].sum(),
+    })
+    columns = pd.RangeIndex(len(snapshot_dates))
+    wide = per_snapshot.unstack('_snapshot')
+    customers = wide.index
+    # Kept datetime64 throughout (snapshots without transactions reindex as NaN),
+    # so the forward fill stays on dates rather than objects
+    date_dtype = per_snapshot['last_date'].dtype
+    last_dates = (
+        per_snapshot['last_date'].unstack('_snapshot')
+        .reindex(index=customers, columns=columns).astype(date_dtype).ffill(axis=1).to_numpy()
+    )
+    frequency = wide['orders'].reindex(columns=columns).fillna(0).cumsum(axis=1).to_numpy(dtype=np.int64)
+    monetary = wide['monetary'].reindex(columns=columns).fillna(0).cumsum(axis=1).to_numpy()
+    # build_rfm measures Recency from the day after the newest transaction so far;
+    # a snapshot with no transactions since the previous one keeps its date
+    reference_dates = tx.groupby('_snapshot')[date_field].max().reindex(columns).cummax().ffill() + dt.timedelta(days=1)
+
+    history = {}
+    for position, snapshot in enumerate(snapshot_dates):
+        active = ~np.isnat(last_dates[:, position])
+        if not active.any():
+            continue
+        recency = (reference_dates[position].to_datetime64() - last_dates[active, position]) // np.timedelta64(1, 'D')
+        rfm = pd.DataFrame({
+            'Recency': recency.astype(np.int64),
+            'Frequency': frequency[active, position],
+            'Monetary': monetary[active, position],
+        }, index=customers[active])
+        history[snapshot] = score_rfm(rfm, rules)
+    return pd.concat(history, names=['Snapshot', customer_id_field])
+
+def segment_transitions(history, from_date, to_date, normalize=False):
+    """Segment-to-segment migration matrix between two snapshots of ``build_rfm_history``.
+
+    Customers without purchases at ``from_date`` are counted under 'New'.
+    """
+    before = history.loc[from_date, 'Segment']
+    after = history.loc[to_date, 'Segment']
+    before = before.reindex(after.index).fillna('New')
+    matrix = pd.crosstab(before.rename('From'), after.rename('To'))
+    if normalize:
+        matrix = matrix.div(matrix.sum(axis=1), axis=0)
+    return matrix
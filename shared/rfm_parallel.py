@@ -0,0 +1,197 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import datetime as dt
+
+from shared.rfm import label_scores, SEGMENT_RULES, MONETARY_DECIMALS
+
+# Sketch size; rank error shrinks roughly as 1/k
+DEFAULT_SKETCH_K = 2000
+QUINTILES = np.linspace(0, 1, 6)
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Items live in compactor levels; an item on level h stands for 2**h values.
+    When a level overflows it is sorted and every other item (random offset)
+    is promoted one level up. Minimum and maximum are tracked exactly so the
+    outer quantile edges match ``pd.qcut``.
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_K, seed=None):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if len(values):
+            self.count += len(values)
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        while True:
+            overflowing = [
+                level for level, items in enumerate(self.levels)
+                if len(items) > self._capacity(level)
+            ]
+            if not overflowing:
+                return
+            level = overflowing[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays behind so that only whole pairs are compacted
+            keep, items = items[:len(items) % 2], items[len(items) % 2:]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            self.levels[level] = keep
+
+    def quantiles(self, qs):
+        """Linearly interpolated quantiles, mirroring ``Series.quantile``."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(items_), 2.0 ** level) for level, items_ in enumerate(self.levels)
+        ])
+        order = np.argsort(items, kind='stable')
+        items, weights = items[order], weights[order]
+        # Rank (0-based) at the middle of the run each item stands for
+        midpoints = np.cumsum(weights) - weights / 2 - 0.5
+        targets = np.asarray(qs, dtype=float) * (self.count - 1)
+        result = np.interp(targets, midpoints, items)
+        result[targets <= 0] = self.min
+        result[targets >= self.count - 1] = self.max
+        return result
+
+
+def _cut(values, edges, labels):
+    return pd.cut(values, edges, labels=labels, include_lowest=True).astype(int)
+
+
+def _aggregate_shard(args):
+    shard, date_field, order_id_field, customer_id_field, monetary_field, snapshot_date, k, seed = args
+    grouped = shard.groupby(customer_id_field)
+    agg = pd.DataFrame({
+        'Recency': (snapshot_date - grouped[date_field].max()).dt.days,
+        'Frequency': grouped[order_id_field].nunique(),
+        'Monetary': grouped[monetary_field].sum(),
+    })
+    rng = np.random.default_rng(seed)
+    recency_sketch = KLLSketch(k, rng.integers(2**32)).update(agg['Recency'])
+    monetary_sketch = KLLSketch(k, rng.integers(2**32)).update(agg['Monetary'].round(MONETARY_DECIMALS))
+    frequency_counts = agg['Frequency'].value_counts()
+    return agg, recency_sketch, monetary_sketch, frequency_counts
+
+
+def _score_shard(args):
+    agg, recency_edges, frequency_edges, monetary_edges, frequency_offsets, rules = args
+    # Global rank with ties broken by customer order, as rank(method='first') does
+    within_ties = agg.groupby('Frequency').cumcount().to_numpy()
+    ranks = frequency_offsets.reindex(agg['Frequency']).to_numpy() + within_ties + 1
+
+    rfm = agg.copy()
+    rfm['R_Score'] = _cut(rfm['Recency'], recency_edges, [5, 4, 3, 2, 1])
+    rfm['F_Score'] = _cut(pd.Series(ranks, index=rfm.index), frequency_edges, [1, 2, 3, 4, 5])
+    rfm['M_Score'] = _cut(rfm['Monetary'].round(MONETARY_DECIMALS), monetary_edges, [1, 2, 3, 4, 5])
+    return label_scores(rfm, rules)
+
+
+def _customer_ranges(customer_ids, n_shards, sample_size=100_000, seed=0):
+    """Shard number for each row, with shards covering increasing customer ranges."""
+    rng = np.random.default_rng(seed)
+    sample = np.unique(rng.choice(customer_ids, size=min(sample_size, len(customer_ids)), replace=False))
+    boundaries = sample[(np.arange(1, n_shards) * len(sample)) // n_shards]
+    return np.searchsorted(np.unique(boundaries), customer_ids, side='right')
+
+
+def build_rfm_parallel(
+    df,
+    date_field,
+    order_id_field,
+    customer_id_field,
+    monetary_field,
+    workers=None,
+    k=DEFAULT_SKETCH_K,
+    rules=SEGMENT_RULES,
+    seed=42,
+):
+    """Score RFM over customer shards in a process pool.
+
+    Transactions are split into contiguous customer-ID ranges. Each worker
+    aggregates its shard and returns KLL sketches of Recency and Monetary plus
+    exact Frequency counts. The coordinator merges them into quintile edges and
+    the workers score their shards against those edges. R and M scores are
+    approximate (see benchmarks/rfm_parallel.py for the measured error); F is
+    exact because the rank-first tie-break only needs per-shard counts.
+    """
+    workers = workers or os.cpu_count()
+    snapshot_date = df[date_field].max() + dt.timedelta(days=1)
+    shard_ids = _customer_ranges(df[customer_id_field].to_numpy(), workers, seed=seed)
+    order = np.argsort(shard_ids, kind='stable')
+    bounds = np.searchsorted(shard_ids[order], np.arange(workers + 1))
+    shards = [df.iloc[order[start:end]] for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+    rng = np.random.default_rng(seed)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = list(pool.map(_aggregate_shard, [
+            (shard, date_field, order_id_field, customer_id_field, monetary_field,
+             snapshot_date, k, rng.integers(2**32))
+            for shard in shards
+        ]))
+
+        recency_sketch, monetary_sketch = partials[0][1], partials[0][2]
+        for _, recency, monetary, _ in partials[1:]:
+            recency_sketch.merge(recency)
+            monetary_sketch.merge(monetary)
+        recency_edges = recency_sketch.quantiles(QUINTILES)
+        monetary_edges = monetary_sketch.quantiles(QUINTILES)
+
+        # Exact rank edges: quintiles of 1..N
+        counts = pd.concat([partial[3] for partial in partials], axis=1).fillna(0).astype(np.int64).sort_index()
+        n_customers = int(counts.to_numpy().sum())
+        frequency_edges = pd.Series(np.arange(1, n_customers + 1, dtype=float)).quantile(QUINTILES).to_numpy()
+        # Customers ranked before each (shard, frequency): lower frequencies anywhere,
+        # plus equal frequencies in earlier shards
+        lower = counts.sum(axis=1).cumsum().shift(fill_value=0)
+        earlier_shards = counts.cumsum(axis=1) - counts
+        offsets = [lower + earlier_shards.iloc[:, i] for i in range(len(partials))]
+
+        scored = list(pool.map(_score_shard, [
+            (partial[0], recency_edges, frequency_edges, monetary_edges, offsets[i], rules)
+            for i, partial in enumerate(partials)
+        ]))
+    rfm = pd.concat(scored)
+    rfm.index.name = customer_id_field
+    return rfm
+
+
+def score_agreement(exact, approximate):
+    """Share of customers whose scores and segment match the exact ``build_rfm``."""
+    approximate = approximate.reindex(exact.index)
+    columns = ['R_Score', 'F_Score', 'M_Score', 'Segment']
+    return {column: float((exact[column] == approximate[column]).mean()) for column in columns}
@@ -0,0 +1,129 @@
+import sqlite3
+from contextlib import closing
+import datetime as dt
+
+import pandas as pd
+
+from shared.rfm import score_rfm, SEGMENT_RULES
+
+# Default location of the persisted per-customer RFM state
+RFM_STATE_PATH = 'rfm_state.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id PRIMARY KEY,
+    last_date INTEGER NOT NULL,
+    frequency INTEGER NOT NULL,
+    monetary REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    customer_id NOT NULL,
+    order_id NOT NULL,
+    PRIMARY KEY (customer_id, order_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _snapshot_date(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'snapshot_date'").fetchone()
+    return None if row is None else pd.Timestamp(row[0])
+
+
+def _scored_rfm(conn, customer_id_field, rules):
+    snapshot_date = _snapshot_date(conn)
+    if snapshot_date is None:
+        raise ValueError("RFM state is empty, call update_rfm with transactions first")
+    state = pd.read_sql_query(
+        "SELECT customer_id, last_date, frequency, monetary FROM customers ORDER BY customer_id",
+        conn,
+        index_col='customer_id',
+    )
+    last_dates = pd.to_datetime(state['last_date'], unit='ns')
+    rfm = pd.DataFrame({
+        'Recency': (snapshot_date - last_dates).dt.days,
+        'Frequency': state['frequency'],
+        'Monetary': state['monetary'],
+    })
+    rfm.index.name = customer_id_field
+    return score_rfm(rfm, rules)
+
+
+def load_rfm(path=RFM_STATE_PATH, customer_id_field='CustomerID', rules=SEGMENT_RULES):
+    """Score the persisted state without applying new transactions."""
+    with closing(_connect(path)) as conn, conn:
+        return _scored_rfm(conn, customer_id_field, rules)
+
+
+def update_rfm(
+    new_transactions,
+    path=RFM_STATE_PATH,
+    date_field='InvoiceDate',
+    order_id_field='InvoiceNo',
+    customer_id_field='CustomerID',
+    monetary_field='Revenue',
+    rules=SEGMENT_RULES,
+):
+    """Fold a batch of transactions into the persisted state and rescore.
+
+    Only customers present in the batch are written: their last purchase date,
+    revenue and order set are updated in place, and the snapshot date moves
+    forward to the day after the newest transaction seen so far. Scores are then
+    recomputed from the per-customer table, so the result matches ``build_rfm``
+    over the full history. Each batch must be applied exactly once.
+    """
+    grouped = new_transactions.groupby(customer_id_field)
+    last_dates = grouped[date_field].max().astype('int64')
+    monetary = grouped[monetary_field].sum()
+    orders = new_transactions[[customer_id_field, order_id_field]].drop_duplicates()
+    batch_snapshot = new_transactions[date_field].max() + dt.timedelta(days=1)
+
+    with closing(_connect(path)) as conn, conn:
+        conn.execute("CREATE TEMP TABLE new_orders (customer_id, order_id, PRIMARY KEY (customer_id, order_id))")
+        conn.executemany(
+            "INSERT INTO new_orders VALUES (?, ?)",
+            zip(orders[customer_id_field].tolist(), orders[order_id_field].tolist()),
+        )
+        # Orders already seen in earlier batches must not count twice
+        new_order_counts = dict(conn.execute("""
+            SELECT n.customer_id, COUNT(*)
+            FROM new_orders n
+            LEFT JOIN orders o ON o.customer_id = n.customer_id AND o.order_id = n.order_id
+            WHERE o.customer_id IS NULL
+            GROUP BY n.customer_id
+        """).fetchall())
+        conn.execute("INSERT OR IGNORE INTO orders SELECT customer_id, order_id FROM new_orders")
+        conn.execute("DROP TABLE new_orders")
+
+        conn.executemany(
+            """
+            INSERT INTO customers (customer_id, last_date, frequency, monetary) VALUES (?, ?, ?, ?)
+            ON CONFLICT (customer_id) DO UPDATE SET
+                last_date = max(last_date, excluded.last_date),
+                frequency = frequency + excluded.frequency,
+                monetary = monetary + excluded.monetary
+            """,
+            (
+                (customer_id, last_date, new_order_counts.get(customer_id, 0), revenue)
+                for customer_id, last_date, revenue in zip(
+                    last_dates.index.tolist(), last_dates.tolist(), monetary.tolist()
+                )
+            ),
+        )
+
+        snapshot_date = _snapshot_date(conn)
+        if snapshot_date is None or batch_snapshot > snapshot_date:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_date', ?)",
+                (batch_snapshot.isoformat(),),
+            )
+        return _scored_rfm(conn, customer_id_field, rules)
@@ -1,33 +1,103 @@
+import numpy as np
+
+# Threshold decimals, as export_text prints them; a threshold of 0.50 is a
+# one-hot column and reads as Yes / No
+RULE_DECIMALS = 2
+
+
 # Translate rules to human-readable
 def parse_rule_line(rule_line, lbl):
+    """One line of an ``export_text`` dump as (depth, sentence)."""
     rule_depth = rule_line.count('|   ')
     content = rule_line.strip().replace('|--- ', '').replace('|   ', '')
 
     if 'class:' in content:
         label = content.split(':')[-1].strip()
-        return rule_depth, f"THEN → {lbl if label == '1' else f'Not {lbl}'}"
+        return rule_depth, _outcome(label, lbl)
     else:
         parts = content.split(' ')
         feature = parts[0].replace('_', ' ')
         op = parts[1]
         value = parts[2] if parts[2] != "" else parts[3]
-        if op == '<=':
-            condition = f"{feature} is **No**" if value == "0.50" else f"{feature} ≤ {value}"
-        else:
-            condition = f"{feature} is **Yes**" if value == "0.50" else f"{feature} > {value}"
-        return rule_depth, f"IF {condition}"
-
-def explain_tree(rules, clf, predictors, lbl):
-    parsed_lines = rules.split('\n')
-    translated = []
-    current_path = []
-    for line in parsed_lines:
-        if not line.strip():
+        return rule_depth, f"IF {_condition(feature, op, value)}"
+
+
+def _outcome(label, lbl):
+    return f"THEN → {lbl if label == '1' else f'Not {lbl}'}"
+
+
+def _condition(feature, op, value):
+    if op == '<=':
+        return f"{feature} is **No**" if value == "0.50" else f"{feature} ≤ {value}"
+    return f"{feature} is **Yes**" if value == "0.50" else f"{feature} > {value}"
+
+
+def _leaf_paths(clf, feature_names, lbl, decimals):
+    """(leaf id, sentences) of every leaf, in the order ``export_text`` prints them."""
+    tree = clf.tree_
+    names = [name.replace('_', ' ') for name in feature_names]
+    outcomes = [_outcome(str(label), lbl) for label in clf.classes_]
+    leaves = []
+    stack = [(0, [])]
+    while stack:
+        node, path = stack.pop()
+        # Leaves have no children: both child ids are -1
+        if tree.children_left[node] == tree.children_right[node]:
+            leaves.append((node, path + [outcomes[np.argmax(tree.value[node][0])]]))
             continue
-        depth, sentence = parse_rule_line(line, lbl)
-        current_path = current_path[:depth]
-        current_path.append(sentence)
-        if sentence.startswith("THEN"):
-            translated.append(" → ".join(current_path))
+        name = names[tree.feature[node]]
+        threshold = f"{tree.threshold[node]:.{decimals}f}"
+        # Right pushed first so the left (<=) branch comes out first
+        stack.append((tree.children_right[node], path + [f"IF {_condition(name, '>', threshold)}"]))
+        stack.append((tree.children_left[node], path + [f"IF {_condition(name, '<=', threshold)}"]))
+    return leaves
+
+
+def leaf_purity(clf):
+    """Share of the majority class in every node of a fitted tree."""
+    value = clf.tree_.value[:, 0, :]
+    return value.max(axis=1) / value.sum(axis=1)
+
+
+def leaf_support(clf):
+    """Share of the (weighted) training rows that reach every node of a fitted tree."""
+    samples = clf.tree_.weighted_n_node_samples
+    return samples / samples[0]
+
+
+def leaf_rules(clf, feature_names, lbl, min_support=0.0, min_purity=0.0, decimals=RULE_DECIMALS):
+    """Rule of every leaf of a fitted ``DecisionTreeClassifier``, indexed by node id.
+
+    The tree's arrays are walked directly, so the rules read exactly like the
+    ones parsed from ``export_text(clf, feature_names=feature_names)``, with no
+    depth limit. Leaves reached by less than ``min_support`` of the training
+    rows, or whose majority class is less than ``min_purity`` of them, get no
+    rule. Split nodes and pruned leaves hold None.
+    """
+    support, purity = leaf_support(clf), leaf_purity(clf)
+    rules = np.full(clf.tree_.node_count, None, dtype=object)
+    for leaf, path in _leaf_paths(clf, feature_names, lbl, decimals):
+        if support[leaf] >= min_support and purity[leaf] >= min_purity:
+            rules[leaf] = " → ".join(path)
+    return rules
+
+
+def rules_for_rows(rules, clf, predictors):
+    """Rule of each row's leaf, with one array lookup into ``leaf_rules``."""
+    return rules[clf.apply(predictors)]
+
+
+def explain_tree(rules, clf, predictors, lbl, feature_names=None, decimals=RULE_DECIMALS):
+    """Leaf id of every row and the rule of every leaf, in ``export_text`` order.
+
+    ``rules`` is the ``export_text`` dump earlier versions parsed; the rules
+    are now read from the tree itself, and it is only kept so callers need
+    not change. ``feature_names`` default to the columns of ``predictors``.
+    """
+    if feature_names is None:
+        feature_names = getattr(predictors, 'columns', None)
+    if feature_names is None:
+        feature_names = [f"feature_{i}" for i in range(clf.tree_.n_features)]
     leaf_ids = clf.apply(predictors)
-    return leaf_ids, translated
\ No newline at end of file
+    translated = [" → ".join(path) for _, path in _leaf_paths(clf, list(feature_names), lbl, decimals)]
+    return leaf_ids, translated
@@ -0,0 +1,90 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from shared.cache import frame_nbytes
+from shared.tracing import span
+
+# Object columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# Integer columns named like identifiers or codes (CustomerID, InvoiceNo,
+# "User ID", product_code). Only these are downcast: measures such as Quantity
+# keep int64, so arithmetic on them cannot overflow a narrow type
+ID_COLUMN_PATTERN = re.compile(r'(?:ID|Id|No|Code|(?:^|[\s_])(?:id|no|code))$')
+
+# Bundled datasets and the columns to parse as dates when loading them
+DATASETS = {
+    'data/simulated_transactions.csv': {'date_columns': ['InvoiceDate']},
+    'data/churn.csv': {'date_columns': []},
+    'data/fashion_products.csv': {'date_columns': []},
+}
+
+
+def downcast_integers(series):
+    """Smallest signed integer type that holds the values (signed, so differences stay safe).
+
+    Meant for identifiers and codes; products or sums of the result can overflow.
+    """
+    return pd.to_numeric(series, downcast='integer')
+
+
+def downcast_floats(series):
+    """float32 when every value survives the round trip, else unchanged."""
+    narrow = series.astype(np.float32)
+    restored = narrow.astype(series.dtype)
+    if ((restored == series) | (restored.isna() & series.isna())).all():
+        return narrow
+    return series
+
+
+def compact_frame(df, date_columns=()):
+    """Return a copy of ``df`` with memory-compact dtypes.
+
+    Low-cardinality strings become categoricals (with sorted categories, so
+    grouping and sorting match plain strings), identifier and code integers
+    (see ``ID_COLUMN_PATTERN``) take the smallest signed type and floats are
+    narrowed only where no value changes.
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col in date_columns:
+            series = pd.to_datetime(series)
+        elif series.dtype == object:
+            if series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(series):
+                series = series.astype('category')
+        elif (pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series)
+              and ID_COLUMN_PATTERN.search(str(col))):
+            series = downcast_integers(series)
+        elif pd.api.types.is_float_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            series = downcast_floats(series)
+        columns[col] = series
+    compact = pd.DataFrame(columns, index=df.index)
+    compact.attrs = dict(df.attrs)
+    return compact
+
+
+def memory_report(before, after):
+    before_mb = frame_nbytes(before) / 1024 ** 2
+    after_mb = frame_nbytes(after) / 1024 ** 2
+    return {
+        'before_mb': round(before_mb, 3),
+        'after_mb': round(after_mb, 3),
+        'saved_pct': round(100 * (1 - after_mb / before_mb), 1) if before_mb else 0.0,
+    }
+
+
+def load_dataset(path):
+    """Load a bundled dataset with compact dtypes.
+
+    The memory saved against a plain ``pd.read_csv`` is kept in
+    ``df.attrs['memory_report']``.
+    """
+    with span("load_dataset", path=path) as traced_span:
+        raw = pd.read_csv(path)
+        df = compact_frame(raw, DATASETS.get(path, {}).get('date_columns', ()))
+        df.attrs['memory_report'] = memory_report(raw, df)
+        traced_span.tag(rows=len(df))
+    return df
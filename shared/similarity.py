@@ -0,0 +1,235 @@
+import os
+
+import numpy as np
+from scipy import sparse
+
+from shared.cache import CACHE_DIR, LRUCache, prune_cache_dir, touch
+from shared.jobs import report_progress, submit
+
+# Neighbours kept per item
+NEIGHBOURS_K = 20
+# Similarity matrix cells per block when computing exact cosine neighbours
+BLOCK_CELLS = 2 ** 24
+# Random-hyperplane LSH over the SVD item factors: independent hash tables,
+# and bits per table chosen so a bucket holds about BUCKET_SIZE items
+LSH_TABLES = 16
+BUCKET_SIZE = 1024
+# A skewed hash can put far more items in one bucket; buckets past this multiple
+# of bucket_size are split at random into parts of bucket_size items, so
+# scoring a bucket never takes bucket² memory
+BUCKET_MAX_FACTOR = 4
+INDEX_FORMAT_VERSION = 2
+
+_indexes = LRUCache(max_entries=8)
+
+
+def _normalize(vectors):
+    if sparse.issparse(vectors):
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return sparse.diags(scale) @ vectors
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors, dtype=float), where=norms > 0)
+
+
+def _top_k(similarities, ids, k):
+    """Best ``k`` (ids, similarities) per row, best first; missing slots are -1 / -inf.
+
+    Only positive similarities count as neighbours: items pointing away from
+    a row (or sharing no raters with it) leave their slot missing, so a row
+    may have fewer than ``k`` neighbours.
+    """
+    similarities = np.where(similarities > 0, similarities, -np.inf)
+    if similarities.shape[1] > k:
+        part = np.argpartition(similarities, -k, axis=1)[:, -k:]
+        similarities = np.take_along_axis(similarities, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    order = np.argsort(-similarities, axis=1, kind='stable')
+    similarities = np.take_along_axis(similarities, order, axis=1)
+    ids = np.where(similarities > -np.inf, np.take_along_axis(ids, order, axis=1), -1)
+    if ids.shape[1] < k:
+        pad = k - ids.shape[1]
+        ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+        similarities = np.pad(similarities, ((0, 0), (0, pad)), constant_values=-np.inf)
+    return ids, similarities
+
+
+def exact_neighbours(vectors, k=NEIGHBOURS_K, rows=None):
+    """Top-``k`` cosine neighbours of ``rows`` (default: every item) among all items.
+
+    ``vectors`` is items x features, dense or sparse. Scores are computed one
+    block of rows at a time, so memory stays at about ``BLOCK_CELLS`` floats.
+    Only items with a positive similarity are kept; missing slots are -1 / -inf.
+    """
+    unit = _normalize(vectors)
+    block = max(1, BLOCK_CELLS // unit.shape[0])
+    rows = np.arange(unit.shape[0]) if rows is None else np.asarray(rows)
+    all_ids = np.arange(unit.shape[0])
+    neighbours, similarities = [], []
+    for start in range(0, len(rows), block):
+        chunk = rows[start:start + block]
+        scores = unit[chunk] @ unit.T
+        scores = scores.toarray() if sparse.issparse(scores) else np.asarray(scores)
+        scores[np.arange(len(chunk)), chunk] = -np.inf
+        ids, sims = _top_k(scores, np.broadcast_to(all_ids, scores.shape), k)
+        neighbours.append(ids)
+        similarities.append(sims)
+    return np.vstack(neighbours), np.vstack(similarities)
+
+
+def lsh_neighbours(vectors, k=NEIGHBOURS_K, tables=LSH_TABLES, bucket_size=BUCKET_SIZE, seed=0):
+    """Approximate top-``k`` cosine neighbours of every item.
+
+    Each table hashes the items by the signs of random projections; exact
+    cosine is computed only within a bucket, and the candidates of all tables
+    are merged. Cost is about items x bucket_size x tables instead of items²;
+    oversized buckets are split (see ``BUCKET_MAX_FACTOR``).
+    """
+    # float32 halves the memory traffic of the bucket products; ranks barely move
+    unit = _normalize(np.asarray(vectors, dtype=float)).astype(np.float32)
+    n_items = unit.shape[0]
+    bits = max(1, int(np.ceil(np.log2(max(n_items / bucket_size, 1)))))
+    rng = np.random.default_rng(seed)
+    candidates, candidate_sims = [], []
+    for _ in range(tables):
+        planes = rng.normal(size=(unit.shape[1], bits))
+        codes = (unit @ planes > 0) @ (1 << np.arange(bits))
+        order = np.argsort(codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        ids = np.full((n_items, k), -1)
+        sims = np.full((n_items, k), -np.inf, dtype=np.float32)
+        for bucket in np.split(order, bounds):
+            if len(bucket) > BUCKET_MAX_FACTOR * bucket_size:
+                parts = np.array_split(rng.permutation(bucket), -(-len(bucket) // bucket_size))
+            else:
+                parts = [bucket]
+            for part in parts:
+                scores = unit[part] @ unit[part].T
+                np.fill_diagonal(scores, -np.inf)
+                ids[part], sims[part] = _top_k(scores, np.broadcast_to(part, scores.shape), k)
+        candidates.append(ids)
+        candidate_sims.append(sims)
+    ids, sims = np.hstack(candidates), np.hstack(candidate_sims)
+    # The same neighbour can come from several tables: keep one copy
+    order = np.argsort(ids, axis=1, kind='stable')
+    ids, sims = np.take_along_axis(ids, order, axis=1), np.take_along_axis(sims, order, axis=1)
+    repeated = np.zeros_like(ids, dtype=bool)
+    repeated[:, 1:] = ids[:, 1:] == ids[:, :-1]
+    sims[repeated | (ids < 0)] = -np.inf
+    return _top_k(sims, ids, k)
+
+
+def build_item_index(model, source='factors', k=NEIGHBOURS_K):
+    """Top-``k`` neighbour lists for every item of a recommender model.
+
+    ``source='ratings'``: exact cosine between the items' rating columns (all
+    users, unrated counted as 0). ``source='factors'``: LSH over the SVD item
+    factors, for catalogues too large for exact all-pairs scoring.
+    """
+    report_progress(0.1, "Finding similar products")
+    if source == 'ratings':
+        neighbours, similarities = exact_neighbours(model['ratings'].T.tocsr(), k)
+    elif source == 'factors':
+        neighbours, similarities = lsh_neighbours(model['qi'], k)
+    else:
+        raise ValueError(f"Unknown similarity source: {source}")
+    return index_items({
+        'neighbours': neighbours.astype(np.int32),
+        'similarities': similarities.astype(np.float32),
+        'raw_iids': model['raw_iids'],
+    })
+
+
+def index_items(index):
+    index['inner_iid'] = {raw: i for i, raw in enumerate(index['raw_iids'].tolist())}
+    return index
+
+
+def _index_path(key):
+    return os.path.join(CACHE_DIR, f"items-{key}.npz")
+
+
+def index_key(model_key, source='factors', k=NEIGHBOURS_K):
+    return f"{model_key}-{source}-{k}-v{INDEX_FORMAT_VERSION}"
+
+
+def cached_item_index(model_key, source='factors', k=NEIGHBOURS_K):
+    """Neighbour index of a cached model if it is in memory or on disk, else None."""
+    key = index_key(model_key, source, k)
+    index = _indexes.get(key)
+    path = _index_path(key)
+    if index is None and os.path.exists(path):
+        with np.load(path, allow_pickle=False) as saved:
+            index = index_items({name: saved[name] for name in ['neighbours', 'similarities', 'raw_iids']})
+        touch(path)
+        index = _indexes.put(key, index)
+    return index
+
+
+def _cache_index(key, index):
+    if index['raw_iids'].dtype != object:
+        path = _index_path(key)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, **{name: index[name] for name in ['neighbours', 'similarities', 'raw_iids']})
+        os.replace(tmp, path)
+        prune_cache_dir(keep=path)
+    return _indexes.put(key, index)
+
+
+def get_item_index(model_key, model, source='factors', k=NEIGHBOURS_K):
+    """Neighbour index of a cached model, from memory, disk, or built here and saved.
+
+    Blocks for the whole build on a miss; pages use ``start_item_index``.
+    """
+    index = cached_item_index(model_key, source, k)
+    if index is None:
+        index = _cache_index(index_key(model_key, source, k), build_item_index(model, source, k))
+    return index
+
+
+def start_item_index(model_key, model, source='factors', k=NEIGHBOURS_K, owner=None, retry=False):
+    """Build the neighbour index in the job pool unless it is cached; returns the job id (the index key).
+
+    When the job finishes the index is cached, so ``cached_item_index`` returns it.
+    A failed job is only run again with ``retry``.
+    """
+    key = index_key(model_key, source, k)
+    if cached_item_index(model_key, source, k) is None:
+        # Only what build_item_index reads goes to the worker
+        arrays = {name: model[name] for name in ['ratings', 'qi', 'raw_iids']}
+        submit(key, build_item_index, arrays, source, k, owner=owner,
+               on_done=lambda index: _cache_index(key, index), retry=retry)
+    return key
+
+
+def similar_items(index, raw_iid, n=NEIGHBOURS_K):
+    """Up to ``n`` most similar items as a list of (raw item id, cosine similarity)."""
+    i = index['inner_iid'][raw_iid]
+    ids, sims = index['neighbours'][i, :n], index['similarities'][i, :n]
+    found = ids >= 0
+    return list(zip(index['raw_iids'][ids[found]], sims[found]))
+
+
+def recommend_similar(index, rated_iids, n=5):
+    """Items for a user known only by a few rated items (e.g. not in the trained model yet).
+
+    Each candidate scores the sum of its similarities to the rated items; the
+    rated items themselves are left out.
+    """
+    rated = [index['inner_iid'][raw] for raw in rated_iids if raw in index['inner_iid']]
+    ids = index['neighbours'][rated].ravel()
+    sims = index['similarities'][rated].ravel()
+    keep = (ids >= 0) & ~np.isin(ids, rated)
+    scores = np.bincount(ids[keep], weights=sims[keep], minlength=len(index['raw_iids']))
+    top = np.flatnonzero(scores)[np.argsort(-scores[scores != 0], kind='stable')][:n]
+    return list(zip(index['raw_iids'][top], scores[top]))
+
+
+def neighbour_recall(approximate, exact):
+    """Share of the exact neighbours that the approximate lists found, over all items."""
+    found = 0
+    for approx_row, exact_row in zip(approximate, exact):
+        exact_row = exact_row[exact_row >= 0]
+        found += np.isin(exact_row, approx_row).sum()
+    return found / max(1, (exact >= 0).sum())
@@ -1,16 +1,330 @@
-import pandas as pd
+import os
+
 import numpy as np
-from faker import Faker
-import random
-import uuid
-import streamlit as st
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Synthetic datasets shaped like the bundled ones, for load tests at any size.
+# Every value is drawn with vectorized NumPy; rows are produced in chunks so
+# tens of millions of them can be written without holding them in memory.
+CHUNK_ROWS = 1_000_000
+# Characters that make a CSV field need quotes; like the bundled files (and
+# pandas' to_csv), only such fields are quoted
+CSV_SPECIAL = r'[,"\r\n]'
+
+# Transactions (data/simulated_transactions.csv)
+TRANSACTION_COLUMNS = ['Quantity', 'UnitPrice', 'CustomerID', 'InvoiceDate', 'Description', 'StockCode', 'InvoiceNo']
+SIMULATION_START = '2024-07-14'
+SIMULATION_DAYS = 365
+CUSTOMER_ID_START = 10_000
+INVOICE_NO_START = 100_000
+# Pareto shape of how often customers buy (lower: a few customers buy most)
+# and of the quantities per line (the bundled data has a median of 4 and a
+# long tail into the thousands)
+CUSTOMER_SHAPE = 1.5
+QUANTITY_SHAPE = 1.1
+QUANTITY_SCALE = 3
+MAX_QUANTITY = 5_000
+# Popularity of the n-th most popular product falls off as 1 / n ** exponent
+POPULARITY_EXPONENT = 1.0
+# Mean lines per invoice
+BASKET_MEAN = 2
+# Median unit price and its spread between products and between sales
+PRICE_MEDIAN = 18
+PRICE_SPREAD = 0.5
+PRICE_JITTER = 0.3
+# Sales per day relative to the yearly mean, January to December
+MONTHLY_SEASONALITY = [0.8, 0.75, 0.85, 0.9, 0.95, 0.95, 0.9, 0.95, 1.0, 1.1, 1.3, 1.6]
+PRODUCT_WORDS = [
+    'Charge', 'Early', 'Eat', 'Job', 'Us', 'Fly', 'Home', 'Green', 'Summer', 'Classic',
+    'Bright', 'Garden', 'Vintage', 'Travel', 'Cozy', 'Party', 'Kitchen', 'Retro', 'Winter', 'Daily',
+]
+
+# Fashion ratings (data/fashion_products.csv)
+FASHION_COLUMNS = ['User ID', 'Product ID', 'Product Name', 'Brand', 'Category', 'Price', 'Rating', 'Color', 'Size']
+FASHION_NAMES = ['Dress', 'Shoes', 'T-shirt', 'Jeans', 'Sweater']
+FASHION_BRANDS = ['Adidas', 'H&M', 'Zara', 'Gucci', 'Nike']
+FASHION_CATEGORIES = ["Men's Fashion", "Women's Fashion", "Kids' Fashion"]
+FASHION_COLORS = ['Black', 'Yellow', 'White', 'Blue', 'Green', 'Red']
+FASHION_SIZES = ['XL', 'L', 'S', 'M']
+# Taste dimensions behind the ratings, so recommenders have structure to find
+TASTE_FACTORS = 4
+RATING_NOISE = 0.5
+
+# Churn (data/churn.csv): category shares as in the bundled data
+CHURN_COLUMNS = [
+    'gender', 'SeniorCitizen', 'Partner', 'Dependents', 'tenure', 'PhoneService', 'MultipleLines',
+    'InternetService', 'OnlineSecurity', 'OnlineBackup', 'DeviceProtection', 'TechSupport', 'StreamingTV',
+    'StreamingMovies', 'Contract', 'PaperlessBilling', 'PaymentMethod', 'MonthlyCharges', 'TotalCharges', 'Churn',
+]
+INTERNET_SERVICES = {'Fiber optic': 0.44, 'DSL': 0.344, 'No': 0.216}
+# Share of internet customers with each add-on
+INTERNET_ADDONS = {
+    'OnlineSecurity': 0.37, 'OnlineBackup': 0.44, 'DeviceProtection': 0.44,
+    'TechSupport': 0.37, 'StreamingTV': 0.49, 'StreamingMovies': 0.5,
+}
+CONTRACTS = {'Month-to-month': 0.551, 'One year': 0.209, 'Two year': 0.24}
+PAYMENT_METHODS = {
+    'Electronic check': 0.336, 'Mailed check': 0.228,
+    'Bank transfer (automatic)': 0.219, 'Credit card (automatic)': 0.217,
+}
+MAX_TENURE = 72
+
+
+def _chunk_streams(n_rows, chunk_rows, seed):
+    """(first row, rows, generator) per chunk; chunks draw from independent streams."""
+    starts = range(0, n_rows, chunk_rows)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    for start, chunk_seed in zip(starts, seeds):
+        yield start, min(chunk_rows, n_rows - start), np.random.default_rng(chunk_seed)
+
+
+def _cdf(weights):
+    cdf = np.cumsum(weights, dtype=float)
+    return cdf / cdf[-1]
+
+
+def _draw(cdf, size, rng):
+    """Indices drawn with the probabilities behind ``cdf`` (cheaper than rng.choice per chunk)."""
+    return np.minimum(np.searchsorted(cdf, rng.random(size), side='right'), len(cdf) - 1)
+
+
+def _choice(options, size, rng):
+    """Labels drawn from an {label: share} dict."""
+    labels = np.array(list(options), dtype=object)
+    return labels[_draw(_cdf(list(options.values())), size, rng)]
+
+
+def popularity_weights(n, exponent=POPULARITY_EXPONENT, seed=0):
+    """Zipf-like weights in a random order, so item ids say nothing about popularity."""
+    rng = np.random.default_rng(seed)
+    return rng.permutation(1.0 / np.arange(1, n + 1) ** exponent)
+
+
+def activity_weights(n, shape=CUSTOMER_SHAPE, seed=0):
+    """Pareto-distributed activity per customer: most buy rarely, a few very often."""
+    return np.random.default_rng(seed).pareto(shape, n) + 1
+
+
+def product_catalog(n_products, seed=0):
+    """Stock codes, descriptions and base prices of the simulated products."""
+    rng = np.random.default_rng(seed)
+    words = np.array(PRODUCT_WORDS, dtype=object)[np.arange(n_products) % len(PRODUCT_WORDS)]
+    rounds = np.arange(n_products) // len(PRODUCT_WORDS)
+    descriptions = [f"{word} item" if r == 0 else f"{word} item {r + 1}" for word, r in zip(words, rounds)]
+    width = max(3, len(str(n_products - 1)))
+    return pd.DataFrame({
+        'StockCode': [f"P{i:0{width}d}" for i in range(n_products)],
+        'Description': descriptions,
+        'BasePrice': PRICE_MEDIAN * rng.lognormal(0, PRICE_SPREAD, n_products),
+    })
+
+
+def day_weights(start=SIMULATION_START, days=SIMULATION_DAYS):
+    """Relative sales of each day from ``MONTHLY_SEASONALITY``."""
+    dates = pd.date_range(start, periods=days, freq='D')
+    return dates, np.asarray(MONTHLY_SEASONALITY)[dates.month - 1]
+
+
+def transactions(n_rows, n_customers=None, n_products=len(PRODUCT_WORDS), start=SIMULATION_START,
+                 days=SIMULATION_DAYS, seed=0, chunk_rows=CHUNK_ROWS):
+    """Transaction lines in the schema of ``data/simulated_transactions.csv``, as DataFrame chunks.
+
+    Invoices (one customer, one moment) hold about ``BASKET_MEAN`` lines.
+    Customers are picked by Pareto-distributed activity, products by Zipf
+    popularity and days by ``MONTHLY_SEASONALITY``; quantities are Pareto
+    too, so spend per customer is heavily skewed. ``n_customers`` defaults
+    to one per 20 lines, as in the bundled file.
+    """
+    n_customers = n_customers or max(1, n_rows // 20)
+    catalog = product_catalog(n_products, seed)
+    stock_codes = catalog['StockCode'].to_numpy()
+    descriptions = catalog['Description'].to_numpy()
+    base_prices = catalog['BasePrice'].to_numpy()
+    product_cdf = _cdf(popularity_weights(n_products, seed=seed))
+    customer_cdf = _cdf(activity_weights(n_customers, seed=seed))
+    dates, weights = day_weights(start, days)
+    day_cdf = _cdf(weights)
+    first_day = dates[0].to_datetime64().astype('datetime64[s]')
+
+    for first_row, rows, rng in _chunk_streams(n_rows, chunk_rows, seed):
+        # Baskets until the chunk is full; the last one is cut to fit
+        sizes = rng.geometric(1 / BASKET_MEAN, rows)
+        n_invoices = int(np.searchsorted(np.cumsum(sizes), rows)) + 1
+        sizes = sizes[:n_invoices]
+        sizes[-1] -= sizes.sum() - rows
+        invoice = np.repeat(np.arange(n_invoices), sizes)
+
+        customers = _draw(customer_cdf, n_invoices, rng)
+        seconds = _draw(day_cdf, n_invoices, rng) * 86_400 + rng.integers(0, 86_400, n_invoices)
+        products = _draw(product_cdf, rows, rng)
+        yield pd.DataFrame({
+            'Quantity': np.minimum(1 + rng.pareto(QUANTITY_SHAPE, rows) * QUANTITY_SCALE, MAX_QUANTITY).astype(np.int64),
+            'UnitPrice': np.round(base_prices[products] * rng.lognormal(0, PRICE_JITTER, rows), 2),
+            'CustomerID': CUSTOMER_ID_START + customers[invoice],
+            'InvoiceDate': first_day + seconds[invoice].astype('timedelta64[s]'),
+            'Description': descriptions[products],
+            'StockCode': stock_codes[products],
+            # Offset by the chunk's first row, so numbers never repeat across chunks
+            'InvoiceNo': INVOICE_NO_START + first_row + invoice,
+        }, columns=TRANSACTION_COLUMNS)
+
+
+def fashion_catalog(n_products, seed=0):
+    """Product attributes in the schema of ``data/fashion_products.csv`` (without user and rating)."""
+    rng = np.random.default_rng(seed)
+
+    def pick(options):
+        return np.array(options, dtype=object)[rng.integers(0, len(options), n_products)]
+
+    return pd.DataFrame({
+        'Product ID': np.arange(1, n_products + 1),
+        'Product Name': pick(FASHION_NAMES),
+        'Brand': pick(FASHION_BRANDS),
+        'Category': pick(FASHION_CATEGORIES),
+        'Price': rng.integers(10, 101, n_products),
+        'Color': pick(FASHION_COLORS),
+        'Size': pick(FASHION_SIZES),
+    })
+
+
+def fashion_ratings(n_ratings, n_users=None, n_products=None, seed=0, chunk_rows=CHUNK_ROWS):
+    """Ratings in the schema of ``data/fashion_products.csv``, as DataFrame chunks.
+
+    Users are picked by Pareto activity and products by Zipf popularity. A
+    rating is 3 plus the dot product of low-rank user and product tastes plus
+    noise, clipped to 1-5, so SVD has real structure to recover. Sizes
+    default to 10 ratings per user and one product per rating, like the
+    bundled file's proportions.
+    """
+    n_users = n_users or max(1, n_ratings // 10)
+    n_products = n_products or n_ratings
+    catalog = fashion_catalog(n_products, seed)
+    rng = np.random.default_rng(seed)
+    user_taste = rng.normal(0, 1 / np.sqrt(TASTE_FACTORS), (n_users, TASTE_FACTORS))
+    product_taste = rng.normal(0, 1, (n_products, TASTE_FACTORS))
+    user_cdf = _cdf(activity_weights(n_users, seed=seed))
+    product_cdf = _cdf(popularity_weights(n_products, seed=seed))
+
+    for _, rows, rng in _chunk_streams(n_ratings, chunk_rows, seed):
+        users = _draw(user_cdf, rows, rng)
+        products = _draw(product_cdf, rows, rng)
+        taste = np.einsum('ij,ij->i', user_taste[users], product_taste[products])
+        chunk = catalog.iloc[products].reset_index(drop=True)
+        chunk['User ID'] = users + 1
+        chunk['Rating'] = np.clip(3 + taste + rng.normal(0, RATING_NOISE, rows), 1, 5)
+        yield chunk[FASHION_COLUMNS]
+
+
+def churn_customers(n_rows, seed=0, chunk_rows=CHUNK_ROWS):
+    """Customers in the schema of ``data/churn.csv``, as DataFrame chunks.
+
+    Categories follow the bundled data's shares; customers without phone or
+    internet get "No phone service" / "No internet service" in the columns
+    that depend on them, and charges follow the services taken. Churn is drawn from a
+    logistic model in which month-to-month contracts, fibre, short tenure,
+    electronic checks and missing security or support raise the risk, so the
+    churn page finds the familiar drivers. The index continues across chunks,
+    like the bundled file's unnamed first column.
+    """
+    for first_row, rows, rng in _chunk_streams(n_rows, chunk_rows, seed):
+        def yes_no(share):
+            return np.where(rng.random(rows) < share, 'Yes', 'No').astype(object)
+
+        phone = rng.random(rows) < 0.903
+        internet = _choice(INTERNET_SERVICES, rows, rng)
+        has_internet = internet != 'No'
+        chunk = {
+            'gender': np.where(rng.random(rows) < 0.505, 'Male', 'Female').astype(object),
+            'SeniorCitizen': (rng.random(rows) < 0.162).astype(np.int64),
+            'Partner': yes_no(0.483),
+            'Dependents': yes_no(0.298),
+            'tenure': rng.integers(1, MAX_TENURE + 1, rows),
+            'PhoneService': np.where(phone, 'Yes', 'No').astype(object),
+            'MultipleLines': np.where(phone, yes_no(0.467), 'No phone service').astype(object),
+            'InternetService': internet,
+        }
+        for addon, share in INTERNET_ADDONS.items():
+            chunk[addon] = np.where(has_internet, yes_no(share), 'No internet service').astype(object)
+        chunk['Contract'] = _choice(CONTRACTS, rows, rng)
+        chunk['PaperlessBilling'] = yes_no(0.593)
+        chunk['PaymentMethod'] = _choice(PAYMENT_METHODS, rows, rng)
+
+        addons = sum(chunk[addon] == 'Yes' for addon in INTERNET_ADDONS)
+        monthly = (
+            20 * phone + 5 * (chunk['MultipleLines'] == 'Yes')
+            + np.select([internet == 'Fiber optic', internet == 'DSL'], [50, 25], 0)
+            + 5 * addons + rng.normal(0, 2, rows)
+        )
+        monthly = np.round(np.maximum(monthly, 18.25), 2)
+        chunk['MonthlyCharges'] = monthly
+        chunk['TotalCharges'] = np.round(monthly * chunk['tenure'] * rng.uniform(0.95, 1.05, rows), 2)
 
+        logit = (
+            -1.6 + 1.3 * (chunk['Contract'] == 'Month-to-month') + 0.8 * (internet == 'Fiber optic')
+            - 0.035 * chunk['tenure'] + 0.5 * (chunk['OnlineSecurity'] == 'No')
+            + 0.5 * (chunk['TechSupport'] == 'No') + 0.4 * (chunk['PaymentMethod'] == 'Electronic check')
+            + 0.3 * chunk['SeniorCitizen']
+        )
+        chunk['Churn'] = (rng.random(rows) < 1 / (1 + np.exp(-logit))).astype(np.int64)
+        yield pd.DataFrame(chunk, columns=CHURN_COLUMNS, index=pd.RangeIndex(first_row, first_row + rows))
 
 
-fake = Faker()
+def _needs_quotes(table):
+    """Whether any string value of ``table`` contains a ``CSV_SPECIAL`` character."""
+    for column in table.columns:
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            if pc.any(pc.match_substring_regex(column, CSV_SPECIAL)).as_py():
+                return True
+    return False
 
-# Set seed for reproducibility
-np.random.seed(42)
-random.seed(42)
 
+def write_table(chunks, path, index=False):
+    """Write DataFrame chunks to ``path`` as CSV or Parquet (by extension); returns the row count.
 
+    Chunks are streamed through Arrow writers, so memory stays at one chunk.
+    CSV fields are quoted only where needed, as in the bundled files: Arrow
+    writes chunks without quotes, and the rare chunk with a value that needs
+    them goes through ``to_csv``. With ``index`` the index becomes an unnamed
+    first column, as in ``data/churn.csv``. The file appears only once
+    complete; raises ValueError when ``chunks`` is empty.
+    """
+    parquet = os.path.splitext(path)[1].lower() == '.parquet'
+    tmp = f"{path}.{os.getpid()}.tmp"
+    csv_options = pa_csv.WriteOptions(include_header=False, quoting_style='none')
+    # A ParquetWriter, or the CSV file itself
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            if index:
+                chunk = chunk.reset_index(names='')
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                if parquet:
+                    writer = pq.ParquetWriter(tmp, table.schema)
+                else:
+                    writer = open(tmp, 'wb')
+                    writer.write(chunk.iloc[:0].to_csv(index=False, lineterminator='\n').encode())
+            if parquet:
+                writer.write_table(table)
+            elif _needs_quotes(table):
+                writer.write(chunk.to_csv(index=False, header=False, lineterminator='\n').encode())
+            else:
+                pa_csv.write_csv(table, writer, write_options=csv_options)
+            rows += len(chunk)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(tmp)
+        raise
+    if writer is None:
+        raise ValueError(f"No chunks to write to {path}")
+    writer.close()
+    os.replace(tmp, path)
+    return rows
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+
+import pyarrow as pa
+
+from shared.cache import LRUCache, content_hash
+from shared.schema import load_dataset
+
+# Arrow IPC files shared by every process on the host. /dev/shm keeps them in
+# RAM; each process memory-maps them, so the pages are held once, not per session.
+STORE_DIR = os.getenv(
+    "HOLITICA_STORE_DIR",
+    "/dev/shm/holitica" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "holitica-store"),
+)
+STORE_MAX_MB = int(os.getenv("HOLITICA_STORE_MAX_MB", "2048"))
+# Bump when compact_frame changes so stale files are not served
+STORE_FORMAT_VERSION = 2
+
+# Mapped frames of this process; evicted ones are unmapped once no session uses them
+_frames = LRUCache(max_entries=32)
+_dataset_keys = {}
+_lock = threading.Lock()
+
+
+def _path(key):
+    return os.path.join(STORE_DIR, f"{key}-v{STORE_FORMAT_VERSION}.arrow")
+
+
+def _map(key):
+    source = pa.memory_map(_path(key), "r")
+    table = pa.ipc.open_file(source).read_all()
+    # split_blocks keeps each column as its own array so numeric columns stay
+    # views on the mapped file instead of being consolidated into a copy
+    df = table.to_pandas(split_blocks=True)
+    df.attrs["dataset_hash"] = key
+    return df
+
+
+def _prune(keep):
+    # Every server process prunes the same directory: files may vanish under us
+    files = []
+    for entry in os.scandir(STORE_DIR):
+        if entry.name.endswith(".arrow"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= STORE_MAX_MB * 1024 * 1024:
+            break
+        if path == keep:
+            continue
+        total -= size
+        # Processes that already mapped the file keep their mapping
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another process pruned it first
+            continue
+
+
+def get_frame(key):
+    """Read-only, memory-mapped view of a stored frame, or None if it is not stored.
+
+    Returns a shallow copy: callers may add or replace columns, but writing into
+    existing numeric columns fails because they live in the mapped file.
+    """
+    with _lock:
+        df = _frames.get(key)
+        if df is None:
+            try:
+                df = _frames.put(key, _map(key))
+            except FileNotFoundError:
+                # Not stored, or pruned by another process
+                return None
+    return df.copy(deep=False)
+
+
+def put_frame(key, df):
+    """Store a frame under ``key`` (once per host) and return its mapped view."""
+    stored = get_frame(key)
+    if stored is not None:
+        return stored
+    path = _path(key)
+    os.makedirs(STORE_DIR, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Write under a private name and rename, so other processes never map a partial file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    # Mapped before pruning: a mapping outlives the file if another process removes it
+    stored = get_frame(key)
+    _prune(keep=path)
+    if stored is None:
+        # Pruned by another process before it could be mapped; serve it from memory
+        stored = df.copy(deep=False)
+        stored.attrs["dataset_hash"] = key
+    return stored
+
+
+def load_shared_dataset(path):
+    """Bundled dataset served from the shared store, loading it on first use."""
+    stat = os.stat(path)
+    with _lock:
+        key = _dataset_keys.get((path, stat.st_mtime_ns))
+    if key is None:
+        with open(path, "rb") as f:
+            key = content_hash(f.read())
+        with _lock:
+            _dataset_keys[(path, stat.st_mtime_ns)] = key
+    df = get_frame(key)
+    if df is None:
+        df = put_frame(key, load_dataset(path))
+    return df
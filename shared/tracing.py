@@ -0,0 +1,199 @@
+import functools
+import json
+import os
+import resource
+import threading
+import time
+
+import pandas as pd
+
+import env
+from shared.cache import dataset_hash
+
+# Everything here is a no-op unless HOLITICA_TRACE is set (see env.py): span()
+# hands back a shared do-nothing object and traced() returns the function
+# itself, so instrumented code costs next to nothing when tracing is off.
+TRACE = env.TRACE
+TRACE_SINK = env.TRACE_SINK
+METRIC_PREFIX = "holitica_stage"
+
+_local = threading.local()
+_lock = threading.Lock()
+# (stage, page) -> [calls, seconds, last memory delta]
+_totals = {}
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_bytes():
+    """Current resident set size; the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _context():
+    if not hasattr(_local, "spans"):
+        _local.spans, _local.stack, _local.tags = [], [], {}
+    return _local
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def tag(self, **tags):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    def __init__(self, name, tags):
+        self.record = {"stage": name, **tags}
+
+    def tag(self, **tags):
+        """Add tags known only inside the span, e.g. the rows it produced."""
+        self.record.update(tags)
+
+    def __enter__(self):
+        context = _context()
+        self.record = {**context.tags, "depth": len(context.stack), **self.record}
+        context.stack.append(self.record["stage"])
+        # Listed when it starts, so a stage comes before the stages inside it
+        context.spans.append(self.record)
+        self._rss = _rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        context = _context()
+        context.stack.pop()
+        self.record.update(seconds=seconds, rss_delta_bytes=_rss_bytes() - self._rss, ended=time.time())
+        if exc[0] is not None:
+            self.record["error"] = exc[0].__name__
+        record_span(self.record)
+        return False
+
+
+def span(name, df=None, **tags):
+    """Context manager timing one stage: duration and RSS change, plus ``tags``.
+
+    ``df`` tags the span with its row count. Spans nest; the page and dataset
+    set by ``start_page`` / ``set_dataset`` are added to every span.
+    """
+    if not TRACE:
+        return _NO_SPAN
+    if df is not None:
+        tags["rows"] = len(df)
+    return _Span(name, tags)
+
+
+def traced(name=None):
+    """Decorator form of ``span``; a DataFrame first argument gives the row count."""
+    def decorate(fn):
+        if not TRACE:
+            return fn
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            df = args[0] if args and isinstance(args[0], pd.DataFrame) else None
+            with span(stage, df):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_page(page):
+    """Start a page run: forget the previous run's spans and tag new ones with ``page``."""
+    if not TRACE:
+        return
+    context = _context()
+    context.spans, context.stack, context.tags = [], [], {"page": page}
+
+
+def set_dataset(df):
+    """Tag the rest of this page run's spans with the dataset's hash and row count."""
+    if not TRACE or df is None:
+        return
+    _context().tags.update(dataset=dataset_hash(df)[:12], dataset_rows=len(df))
+
+
+def page_spans():
+    """Finished spans of this page run (this thread), in the order they started."""
+    return [record for record in _context().spans if "seconds" in record] if TRACE else []
+
+
+def record_span(record):
+    """Add a finished span to the totals and the JSONL sink (also used for job timings)."""
+    key = (record["stage"], record.get("page", ""))
+    with _lock:
+        totals = _totals.setdefault(key, [0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += record["seconds"]
+        totals[2] = record.get("rss_delta_bytes", 0)
+        if TRACE_SINK.endswith(".jsonl"):
+            with open(TRACE_SINK, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Per-stage totals of this process in the Prometheus text exposition format."""
+    with _lock:
+        totals = dict(_totals)
+    metrics = [
+        ("seconds_total", "counter", "Time spent in the stage", 1),
+        ("calls_total", "counter", "Times the stage ran", 0),
+        ("rss_delta_bytes", "gauge", "Resident memory change over the stage's last run", 2),
+    ]
+    lines = []
+    for suffix, kind, help_text, field in metrics:
+        lines += [f"# HELP {METRIC_PREFIX}_{suffix} {help_text}", f"# TYPE {METRIC_PREFIX}_{suffix} {kind}"]
+        for (stage, page), values in sorted(totals.items()):
+            lines.append(f'{METRIC_PREFIX}_{suffix}{{stage="{_label(stage)}",page="{_label(page)}"}} {values[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def flush():
+    """Rewrite the Prometheus sink file with the current totals."""
+    if not TRACE or not TRACE_SINK or TRACE_SINK.endswith(".jsonl"):
+        return
+    tmp = f"{TRACE_SINK}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, TRACE_SINK)
+
+
+def show_trace_panel():
+    """Sidebar table of this page run's stages; call at the end of the page."""
+    if not TRACE:
+        return
+    # Imported here: the analytics modules import this one and stay usable without Streamlit
+    import streamlit as st
+
+    spans = page_spans()
+    flush()
+    with st.sidebar.expander("⏱️ Page timings", expanded=False):
+        if not spans:
+            st.caption("No traced stages ran (results may have come from a cache).")
+            return
+        tags = _context().tags
+        if "dataset" in tags:
+            st.caption(f"Dataset {tags['dataset']} · {tags['dataset_rows']:,} rows")
+        st.dataframe(pd.DataFrame({
+            "Stage": ["  " * s["depth"] + s["stage"] for s in spans],
+            "Seconds": [round(s["seconds"], 3) for s in spans],
+            "Memory Δ (MB)": [round(s["rss_delta_bytes"] / 1024 ** 2, 1) for s in spans],
+            "Rows": [s.get("rows") for s in spans],
+        }), hide_index=True)